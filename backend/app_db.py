@@ -1,71 +1,121 @@
 
-from flask import Flask, request, jsonify, make_response
-import json, os, re
-from difflib import SequenceMatcher
+import time
+_APP_T0 = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, make_response
+from werkzeug.utils import secure_filename
+import hashlib, json, os, re, tempfile
+from datetime import datetime, timedelta
 from db_manager import DBManager
+from health_rollups import Rollup
 from services.search_service import SearchService
+from services.upload_index import UploadIndex
+from services.data_index import DataFileIndex
+from services.file_lookup import FileLookupCache
+from services.jobs import JobManager
+from services.fanout import RequestMemo, TierFanout
+from services.log_ingest import iter_log_rows
+from services.telemetry import iter_health_samples
+from services.kb_json import best_keyword_answer
+from services.answer_cache import AnswerCache, dir_signature, file_signature, normalize_question
+from vector.embedder import embedder_stats
+from vector.reader import find_any
+from config import (
+    UPLOAD_INDEX_PATH,
+    UPLOAD_SEARCH_MAX_RESULTS,
+    UPLOAD_INDEX_REFRESH_INTERVAL,
+    SQLITE_WAL,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_KB,
+    SQLITE_KB_SNAPSHOT,
+    SQLITE_POOL_SIZE,
+    COLLECTION_NAME,
+    JOB_WORKERS,
+    UPLOAD_CHUNK_BYTES,
+    LOG_INGEST_BATCH,
+    DEEP_RESEARCH_LOG_HOURS,
+    TELEMETRY_BATCH,
+    TELEMETRY_1M_RETENTION_HOURS,
+    TELEMETRY_BASELINE_HOURS,
+    HEALTH_HIGH_LOAD,
+    TELEMETRY_CURRENT_MINUTES,
+    ASK_CACHE_SIZE,
+    ASK_CACHE_TTL,
+    ASK_CACHE_WATCH_INTERVAL,
+    ASK_EXECUTION,
+    ASK_DEADLINE,
+    ASK_FANOUT_WORKERS,
+    DATA_CHUNK_CHARS,
+    DATA_SEARCH_MIN_SCORE,
+    SEARCH_FILE_CACHE_SIZE,
+    SEARCH_FILE_TOP_N,
+)
 
 app = Flask(__name__)
 ROOT = os.path.dirname(__file__)
 DB_PATH = os.path.join(ROOT, "assistant.db")
-mgr = DBManager(DB_PATH)
-search_svc = SearchService()
-
-with open(os.path.join(ROOT, "kb.json")) as f:
-    KB = json.load(f)
-
+KB_JSON_PATH = os.path.join(ROOT, "kb.json")
+DATA_DIR = os.path.join(os.path.dirname(ROOT), "data")
 UPLOAD_DIR = os.path.join(ROOT, "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def sim(a, b):
-    return SequenceMatcher(None, a, b).ratio()
 
-def extract_text(path: str) -> str:
-    if path.lower().endswith(".txt"):
-        try:
-            with open(path, "r", errors="ignore") as f:
-                return f.read()
-        except Exception:
-            return ""
-    return ""
+def _load_kb():
+    global KB
+    with open(KB_JSON_PATH) as f:
+        KB = json.load(f)
+
+
+# EMBED_WORKERS processes are spawned, which re-imports this module as
+# __mp_main__: they only need the model, not the app's DB handles, indexes
+# and watcher threads
+if __name__ != "__mp_main__":
+    mgr = DBManager(
+        DB_PATH,
+        wal=SQLITE_WAL,
+        mmap_size=SQLITE_MMAP_SIZE,
+        cache_kb=SQLITE_CACHE_KB,
+        kb_snapshot=SQLITE_KB_SNAPSHOT,
+        pool_size=SQLITE_POOL_SIZE,
+    )
+    search_svc = SearchService(sqlite_mgr=mgr)
+    jobs = JobManager(max_workers=JOB_WORKERS)
+    tier_fanout = TierFanout(max_workers=ASK_FANOUT_WORKERS, deadline=ASK_DEADLINE)
+
+    _load_kb()
+
+    # /search-file: word index per file version (path + mtime + size)
+    file_lookup = FileLookupCache(maxsize=SEARCH_FILE_CACHE_SIZE)
+    data_index = DataFileIndex(DATA_DIR, suffix=".txt", chunk_chars=DATA_CHUNK_CHARS, min_score=DATA_SEARCH_MIN_SCORE)
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    upload_index = UploadIndex(
+        os.path.join(os.path.dirname(ROOT), "uploads"),
+        str(UPLOAD_INDEX_PATH),
+        max_results=UPLOAD_SEARCH_MAX_RESULTS,
+        refresh_interval=UPLOAD_INDEX_REFRESH_INTERVAL,
+    )
+
+    # /ask response cache; entries are dropped only when a tier they consulted changes
+    answer_cache = AnswerCache(maxsize=ASK_CACHE_SIZE, ttl=ASK_CACHE_TTL or None,
+                               watch_interval=ASK_CACHE_WATCH_INTERVAL)
+    answer_cache.watch_source("uploads", lambda: dir_signature(upload_index.uploads_dir), tier="uploads")
+    answer_cache.watch_source("data", lambda: dir_signature(DATA_DIR, ".txt"), tier="data")
+    answer_cache.watch_source("kb-json", lambda: file_signature(KB_JSON_PATH), tier="kb-json", on_change=_load_kb)
+
+    APP_STARTUP_SECONDS = time.perf_counter() - _APP_T0
+    print(f"[STARTUP] app ready in {APP_STARTUP_SECONDS:.2f}s (SEARCH_BACKEND={search_svc.mode})")
 
 def search_files_fallback(query: str):
-    query = query.lower()
-    data_dir = os.path.join(os.path.dirname(ROOT), "data")
-    texts = []
-    if os.path.isdir(data_dir):
-        for name in os.listdir(data_dir):
-            if name.lower().endswith(".txt"):
-                p = os.path.join(data_dir, name)
-                try:
-                    with open(p, "r", errors="ignore") as f:
-                        texts.append((name, f.read()))
-                except Exception:
-                    pass
-    best_file = None
-    best_score = 0.0
-    for fname, text in texts:
-        s = sim(query, text.lower())
-        if s > best_score:
-            best_score = s
-            best_file = (fname, text[:600])
-    if best_file and best_score > 0.2:
-        return f"From file {best_file[0]} (similarity={best_score:.2f}):\n{best_file[1]}"
+    # Best TF-IDF chunk across data/*.txt (index is rebuilt only when a file changes)
+    hit = data_index.search(query.lower())
+    if hit:
+        fname, chunk, score = hit
+        return f"From file {fname} (similarity={score:.2f}):\n{chunk}"
     return None
 
 def kb_fallback(query: str):
-    query = query.lower()
-    best = None
-    best_score = 0.0
-    for entry in KB:
-        for kw in entry["keywords"]:
-            s = sim(query, kw.lower())
-            if s > best_score:
-                best_score = s
-                best = entry
-    if best and best_score > 0.6:
-        return best["answer"]
-    return None
+    return best_keyword_answer(KB, query)
 
 def cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
@@ -73,29 +123,104 @@ def cors(resp):
     resp.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
     return resp
 
+def _stream_to_disk(stream, dir_path: str):
+    """Copy an upload to a hidden temp file in `dir_path` in UPLOAD_CHUNK_BYTES
+    pieces, hashing as it goes. Returns (temp path, sha256, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                piece = stream.read(UPLOAD_CHUNK_BYTES)
+                if not piece:
+                    break
+                digest.update(piece)
+                out.write(piece)
+                size += len(piece)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
 @app.route("/upload", methods=["POST"])
 def upload_file():
     if "file" not in request.files:
         return cors(jsonify({"error": "no file uploaded"})), 400
 
     f = request.files["file"]
+    filename = secure_filename(f.filename or "")
+    if not filename:
+        return cors(jsonify({"error": "invalid filename"})), 400
 
     uploads_dir = os.path.join(os.path.dirname(ROOT), "uploads")
     os.makedirs(uploads_dir, exist_ok=True)
 
+    tmp_path, sha256, size = _stream_to_disk(f.stream, uploads_dir)
+
+    # Same content already uploaded (under any name): nothing to save or index
+    existing = upload_index.find_by_hash(sha256)
+    if existing is not None:
+        os.remove(tmp_path)
+        print("[UPLOAD] Duplicate of:", existing)
+        return cors(jsonify({
+            "message": "duplicate",
+            "duplicate": True,
+            "filename": os.path.basename(existing),
+            "path": existing,
+            "sha256": sha256,
+            "bytes": size,
+            "indexing": {"lexical": "done", "vector": None},
+        }))
+
     # Save file
-    save_path = os.path.join(uploads_dir, f.filename)
-    f.save(save_path)
+    save_path = os.path.join(uploads_dir, filename)
+    replaced = os.path.exists(save_path)
+    os.replace(tmp_path, save_path)
 
     print("[UPLOAD] Saved to:", save_path)
+    upload_index.index_file(save_path, sha256=sha256)
+    _invalidate_for_upload(save_path, replaced)
+
+    # Only this file goes through chunk -> embed -> upsert; poll status_url
+    vector_job = None
+    if search_svc.mode in ("vector", "hybrid"):
+        job = jobs.submit(
+            "index-file",
+            key=("index-file", COLLECTION_NAME, save_path),
+            fn=_reindexed(lambda job: search_svc.index_vector_files([save_path], progress=job.update)),
+            lock_key=COLLECTION_NAME,
+        )
+        vector_job = dict(job.to_dict(), status_url=f"/vector/jobs/{job.id}")
 
     return cors(jsonify({
         "message": "uploaded",
-        "filename": f.filename,
-        "path": save_path
+        "duplicate": False,
+        "filename": filename,
+        "path": save_path,
+        "sha256": sha256,
+        "bytes": size,
+        "indexing": {"lexical": "done", "vector": vector_job},
     }))
 
 
+def _invalidate_for_upload(path: str, replaced: bool) -> None:
+    # Only questions that occur in the new file can get a different tier-1
+    # answer (whole-text containment is a superset of the per-line match).
+    # Overwriting a file may also remove lines other answers were built from.
+    # The file is streamed once for all cached questions.
+    try:
+        found = find_any(path, answer_cache.questions("uploads"))
+    except OSError:
+        found = set()
+    answer_cache.invalidate(
+        "uploads", "upload",
+        lambda q, entry: (q in found) or (replaced and entry.response.get("source") == "uploaded-file"),
+    )
+    answer_cache.resnapshot("uploads")
+
+
 @app.route("/drive-attach", methods=["POST", "OPTIONS"])
 def drive_attach():
     if request.method == "OPTIONS":
@@ -127,23 +252,18 @@ def search_file():
         return cors(jsonify({"error": "file not found"})), 404
     if not query:
         return cors(jsonify({"error": "empty query"})), 400
-    text = extract_text(path).lower()
-    if not text:
+    if not path.lower().endswith(".txt") or os.path.getsize(path) == 0:
         return cors(jsonify({"error": "file unreadable or empty"})), 400
-    if query in text:
-        return cors(jsonify({"result": f'Exact match for "{query}" found in file.'}))
-    words = re.findall(r"\w+", text)
-    best = None
-    best_score = 0.0
-    for w in words:
-        s = sim(query, w)
-        if s > best_score:
-            best_score = s
-            best = w
+    vocab = file_lookup.get(path)
+    line_no = vocab.find(query)
+    if line_no is not None:
+        return cors(jsonify({"result": f'Exact match for "{query}" found in file.', "line": line_no + 1}))
+    matches = vocab.closest(query, n=SEARCH_FILE_TOP_N)
     return cors(jsonify({
         "result": "No exact match",
-        "closest_match": best,
-        "score": best_score
+        "closest_match": matches[0]["word"] if matches else None,
+        "score": matches[0]["score"] if matches else 0.0,
+        "matches": matches,
     }))
 
 @app.route("/db/search", methods=["POST"])
@@ -169,79 +289,227 @@ def db_add_kb():
     answer = data.get("answer") or ""
     keywords = data.get("keywords") or ""
     mgr.insert_kb(cat, question, answer, keywords)
+    answer_cache.invalidate("kb", "kb-insert")
     return jsonify({"status": "ok"})
 
+def _json_records(key: str, device):
+    """Records and default device from a JSON ingest body: either an array of
+    records or {"device": ..., key: [...]}. None if the body is not valid JSON
+    of either shape."""
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        return data, device
+    if isinstance(data, dict) and isinstance(data.get(key, []), list):
+        return data.get(key) or [], data.get("device") or device
+    return None
+
+
+@app.route("/logs/ingest", methods=["POST", "OPTIONS"])
+def logs_ingest():
+    """Bulk log ingestion.
+
+    JSON body: {"device": "...", "logs": ["line", {"text", "timestamp", "device"}, ...]}
+    or just the array of lines/records. Any other body is read as a stream of lines (plain log lines or NDJSON
+    records) and written in LOG_INGEST_BATCH-row transactions as it arrives.
+    `?device=` tags plain lines (otherwise a "device X"/"host=X" token in the
+    line is used); records may carry their own "device".
+    """
+    if request.method == "OPTIONS":
+        return cors(make_response("", 204))
+    device = request.args.get("device")
+    t0 = time.perf_counter()
+    if request.is_json:
+        body = _json_records("logs", device)
+        if body is None:
+            return cors(jsonify({"error": "expected a JSON array or {\"logs\": [...]}"})), 400
+        rows = iter_log_rows(*body)
+    else:
+        rows = iter_log_rows(request.stream, device)
+    n = mgr.insert_logs_bulk(rows, batch_size=LOG_INGEST_BATCH)
+    elapsed = time.perf_counter() - t0
+    return cors(jsonify({
+        "ingested": n,
+        "seconds": round(elapsed, 4),
+        "lines_per_sec": round(n / elapsed, 1) if elapsed > 0 else None,
+    }))
+
+
+_rollup_pruned_at = 0.0
+
+
+@app.route("/telemetry/ingest", methods=["POST", "OPTIONS"])
+def telemetry_ingest():
+    """Batched device health samples.
+
+    JSON body: {"device": "...", "samples": [{"device", "cpu", "ram", "status", "timestamp"}, ...]}
+    or just the array of samples. Any other body is read as NDJSON, one sample per line. Samples are stored
+    per endpoint (added to `endpoints` on first sight) and folded into the
+    1m/1h rollups in TELEMETRY_BATCH-sample transactions.
+    """
+    global _rollup_pruned_at
+    if request.method == "OPTIONS":
+        return cors(make_response("", 204))
+    device = request.args.get("device")
+    t0 = time.perf_counter()
+    if request.is_json:
+        body = _json_records("samples", device)
+        if body is None:
+            return cors(jsonify({"error": "expected a JSON array or {\"samples\": [...]}"})), 400
+        samples = iter_health_samples(*body, HEALTH_HIGH_LOAD)
+    else:
+        samples = iter_health_samples(request.stream, device, HEALTH_HIGH_LOAD)
+    n = mgr.insert_health_bulk(samples, batch_size=TELEMETRY_BATCH)
+    elapsed = time.perf_counter() - t0
+    pruned = 0
+    if time.time() - _rollup_pruned_at > 600:
+        _rollup_pruned_at = time.time()
+        cutoff = datetime.utcnow() - timedelta(hours=TELEMETRY_1M_RETENTION_HOURS)
+        pruned = mgr.prune_health_rollups("1m", cutoff.isoformat())
+    return cors(jsonify({
+        "ingested": n,
+        "seconds": round(elapsed, 4),
+        "samples_per_sec": round(n / elapsed, 1) if elapsed > 0 else None,
+        "pruned_rollups": pruned,
+    }))
+
+
+@app.route("/telemetry/<device>", methods=["GET"])
+def telemetry_device(device):
+    """Load verdict for a device plus its recent 1h rollups (`?hours=`, default 24)."""
+    load = mgr.device_load(device, TELEMETRY_BASELINE_HOURS, HEALTH_HIGH_LOAD, TELEMETRY_CURRENT_MINUTES)
+    if load is None:
+        return cors(jsonify({"error": "no telemetry for device", "device": device})), 404
+    hours = request.args.get("hours", default=24, type=int)
+    hourly = [
+        {"bucket": r["bucket_start"], **Rollup.from_row(r).summary()}
+        for r in mgr.health_rollups(device, "1h", limit=hours)
+    ]
+    return cors(jsonify({**load, "hourly": hourly}))
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "startup": dict(search_svc.startup_report(), app_startup_seconds=round(APP_STARTUP_SECONDS, 4)),
+        "embedder": embedder_stats(),
+        "query_embed_cache": search_svc.query_cache_stats(),
+        "synthesis": search_svc.synth_stats(),
+        "ask_cache": answer_cache.stats(),
+        "data_index": data_index.stats(),
+        "search_file_cache": file_lookup.stats(),
+        "ask_fanout": dict(tier_fanout.stats(), execution=ASK_EXECUTION),
+    })
+
 # ---------------------------
 # Vector indexing endpoints
 # ---------------------------
 
+def _job_response(job):
+    body = job.to_dict()
+    body["status_url"] = f"/vector/jobs/{job.id}"
+    return jsonify({"ok": True, "job": body}), 202
+
+
+def _reindexed(fn):
+    """Wrap a vector indexing job so cached KB-tier answers are dropped once it finishes."""
+    def run(job):
+        try:
+            return fn(job)
+        finally:
+            if search_svc.mode in ("vector", "hybrid"):
+                answer_cache.invalidate("kb", "reindex")
+    return run
+
+
 @app.route("/vector/index/sqlite", methods=["POST"])
 def vector_index_sqlite():
-    try:
-        result = search_svc.index_vector_from_sqlite()
-        return jsonify({"ok": True, "result": result})
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
+    # runs in the background; poll GET /vector/jobs/<id>
+    job = jobs.submit(
+        "index-sqlite",
+        key=("index-sqlite", COLLECTION_NAME),
+        fn=_reindexed(lambda job: search_svc.index_vector_from_sqlite(progress=job.update)),
+        lock_key=COLLECTION_NAME,
+    )
+    return _job_response(job)
 
 
 @app.route("/vector/index/uploads", methods=["POST"])
 def vector_index_uploads():
-    try:
-        # index both backend/uploads and repo-root /uploads
-        backend_uploads = os.path.join(ROOT, "uploads")
-        repo_uploads = os.path.join(os.path.dirname(ROOT), "uploads")
-        res1 = search_svc.index_vector_from_dir(backend_uploads)
-        res2 = search_svc.index_vector_from_dir(repo_uploads)
-        return jsonify({"ok": True, "backend_uploads": res1, "repo_uploads": res2})
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
+    # index both backend/uploads and repo-root /uploads
+    backend_uploads = os.path.join(ROOT, "uploads")
+    repo_uploads = os.path.join(os.path.dirname(ROOT), "uploads")
 
+    def run(job):
+        job.update(phase="backend_uploads")
+        res1 = search_svc.index_vector_from_dir(backend_uploads, progress=job.update)
+        job.update(phase="repo_uploads")
+        res2 = search_svc.index_vector_from_dir(repo_uploads, progress=job.update)
+        return {"backend_uploads": res1, "repo_uploads": res2}
 
-@app.route("/ask", methods=["POST", "OPTIONS"])
-def ask():
+    job = jobs.submit("index-uploads", key=("index-uploads", COLLECTION_NAME), fn=_reindexed(run), lock_key=COLLECTION_NAME)
+    return _job_response(job)
 
-    if request.method == "OPTIONS":
-        return cors(make_response("", 204))
 
-    data = request.get_json(silent=True) or {}
-    q_raw = data.get("question") or ""
-    q = q_raw.lower().strip()
+@app.route("/vector/jobs/<job_id>", methods=["GET"])
+def vector_job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "unknown job"}), 404
+    return jsonify({"ok": True, "job": job.to_dict()})
+
+
+@app.route("/vector/jobs", methods=["GET"])
+def vector_jobs():
+    return jsonify({"ok": True, "jobs": [j.to_dict() for j in jobs.list()]})
+
 
+DOMAIN_KEYWORDS = [
+    "wifi", "wi-fi", "wireless",
+    "vpn", "tunnel", "remote access",
+    "outlook", "email", "mail",
+    "slow", "lag", "performance",
+    "smart card", "piv", "badge",
+    "endpoint", "device", "laptop",
+    "automation", "patch", "health"
+]
+
+
+# Each tier returns a response dict, or None to fall through to the next one.
+# Tiers that read the same source share a RequestMemo, so /data is scanned at
+# most once per question even though two tiers consult it.
+
+def _tier_uploaded_file(q: str, memo: RequestMemo):
     # --- 1) ALWAYS SEARCH UPLOADED FILES FIRST ---
     # If user query matches content inside uploaded or drive files, return those
     file_hits = search_uploaded_files(q)
     if file_hits:
         print("[SOURCE] uploaded-file")
-        return cors(jsonify({
+        return {
             "answer": "Found in uploaded file:\n\n" + "\n".join(file_hits),
             "source": "uploaded-file",
             "confidence": 1.0
-        }))
+        }
+    return None
 
+
+def _tier_data_file(q: str, memo: RequestMemo):
     # --- 2) If no uploaded-file match, search /data/*.txt and logs ---
-    txt_hits = search_files_fallback(q)
+    txt_hits = memo.call("data-files", search_files_fallback, q)
     if txt_hits:
         print("[SOURCE] data-file")
-        return cors(jsonify({
+        return {
             "answer": "Found in data files:\n\n" + txt_hits,
             "source": "data-file",
             "confidence": 0.9
-        }))
+        }
+    return None
 
-    # ---- 1) Domain keywords: only answer endpoint-style questions ----
-    domain_keywords = [
-        "wifi", "wi-fi", "wireless",
-        "vpn", "tunnel", "remote access",
-        "outlook", "email", "mail",
-        "slow", "lag", "performance",
-        "smart card", "piv", "badge",
-        "endpoint", "device", "laptop",
-        "automation", "patch", "health"
-    ]
 
-    if not any(k in q for k in domain_keywords):
+def _tier_domain_rules(q: str, memo: RequestMemo):
+    # ---- 1) Domain keywords: only answer endpoint-style questions ----
+    if not any(k in q for k in DOMAIN_KEYWORDS):
         # Outside our demo domain → don’t try to be clever
-        return cors(jsonify({
+        return {
             "answer": (
                 "This demo assistant is focused on endpoint support "
                 "(WiFi, VPN, performance, Outlook, smart card, automation). "
@@ -249,7 +517,7 @@ def ask():
             ),
             "source": "domain-filter",
             "confidence": 0.0
-        }))
+        }
 
     # ---- 2) Explicit rule: WiFi + VPN together ----
     if ("wifi" in q or "wi-fi" in q or "wireless" in q) and "vpn" in q:
@@ -265,58 +533,253 @@ def ask():
             "5) Capture exact time, device name, and VPN error messages for escalation."
         )
         print("[SOURCE] rule-wifi-vpn")
-        return cors(jsonify({
+        return {
             "answer": answer,
             "source": "rule-wifi-vpn",
             "confidence": 1.0
-        }))
+        }
+    return None
+
+
+# KB/vector answers below this confidence fall through to the later tiers
+KB_MIN_CONFIDENCE = 0.45
 
-    # ---- 3) KB search (switchable backend: sqlite / postgres / vector) ----
-    kb_res = search_svc.search_kb(q, where=None)
-    print(f"[DEBUG] KB backend={kb_res.source} confidence={kb_res.confidence:.2f}")
 
-    if kb_res.answer and kb_res.confidence >= 0.45:
+def _kb_tier_response(kb_res):
+    print(f"[DEBUG] KB backend={kb_res.source} confidence={kb_res.confidence:.2f}")
+    if kb_res.answer and kb_res.confidence >= KB_MIN_CONFIDENCE:
         print("[SOURCE] " + kb_res.source)
         resp = {
             "answer": kb_res.answer,
             "source": kb_res.source,
             "confidence": kb_res.confidence
         }
-        # If vector mode, include contexts to help debugging
-        if kb_res.contexts is not None and kb_res.source.startswith("vector"):
+        # If vector/hybrid mode, include contexts to help debugging
+        if kb_res.contexts is not None and kb_res.source.startswith(("vector", "hybrid")):
             resp["contexts"] = kb_res.contexts
-        return cors(jsonify(resp))
+        return resp
+    return None
+
+
+def _tier_kb(q: str, memo: RequestMemo):
+    # ---- 3) KB search (switchable backend: sqlite / postgres / vector) ----
+    return _kb_tier_response(search_svc.search_kb(q, where=None))
 
+
+def _tier_files(q: str, memo: RequestMemo):
     # ---- 4) Data file search (/data/*.txt) ----
-    f_text = search_files_fallback(q)
+    f_text = memo.call("data-files", search_files_fallback, q)
     if f_text:
         print("[SOURCE] files")
-        return cors(jsonify({
+        return {
             "answer": f_text,
             "source": "files",
             "confidence": 0.4
-        }))
+        }
+    return None
+
 
+def _tier_kb_json(q: str, memo: RequestMemo):
     # ---- 5) JSON kb.json fallback ----
     kb_ans = kb_fallback(q)
     if kb_ans:
         print("[SOURCE] kb-json")
-        return cors(jsonify({
+        return {
             "answer": kb_ans,
             "source": "kb-json",
             "confidence": 0.35
-        }))
+        }
+    return None
+
 
+def _no_answer():
     # ---- 6) Final fallback ----
     print("[SOURCE] none")
-    return cors(jsonify({
+    return {
         "answer": (
             "I'm not sure. Try rephrasing the question with more detail or "
             "upload a related document to search within."
         ),
         "source": "none",
         "confidence": 0.0
-    }))
+    }
+
+
+PRE_KB_TIERS = [_tier_uploaded_file, _tier_data_file, _tier_domain_rules]
+POST_KB_TIERS = [_tier_files, _tier_kb_json]
+
+
+def _run_tiers(tiers, q: str, memo: RequestMemo):
+    for tier in tiers:
+        resp = tier(q, memo)
+        if resp is not None:
+            return resp
+    return None
+
+
+def _pre_kb_tiers(q: str, memo: RequestMemo):
+    """Tiers that run before the KB search. Returns a response dict, or None
+    to continue with the KB tier."""
+    return _run_tiers(PRE_KB_TIERS, q, memo)
+
+
+def _post_kb_tiers(q: str, memo: RequestMemo):
+    """Tiers after the KB search; always returns a response dict."""
+    return _run_tiers(POST_KB_TIERS, q, memo) or _no_answer()
+
+
+def _ask_sequential(q: str):
+    memo = RequestMemo()
+    resp = _run_tiers(PRE_KB_TIERS + [_tier_kb] + POST_KB_TIERS, q, memo) or _no_answer()
+    return resp, True
+
+
+def _ask_concurrent(q: str):
+    """All tiers at once under ASK_DEADLINE; the first non-None in cascade order wins."""
+    memo = RequestMemo()
+
+    def entry(t):
+        return t.__name__.replace("_tier_", ""), lambda: t(q, memo)
+
+    tiers = [entry(_tier_uploaded_file), entry(_tier_data_file)]
+    # the domain/rule tier is pure and instant: when it answers, nothing below
+    # it can win, so the KB and later tiers are not even started
+    gate = _tier_domain_rules(q, memo)
+    if gate is not None:
+        tiers.append(("domain_rules", lambda: gate))
+    else:
+        tiers += [entry(t) for t in [_tier_kb] + POST_KB_TIERS]
+    name, resp, complete = tier_fanout.run(tiers)
+    print(f"[FANOUT] winner={name} complete={complete}")
+    return (resp or _no_answer()), complete
+
+
+@app.route("/ask", methods=["POST", "OPTIONS"])
+def ask():
+
+    if request.method == "OPTIONS":
+        return cors(make_response("", 204))
+
+    data = request.get_json(silent=True) or {}
+    q = normalize_question(data.get("question") or "")
+
+    cached = answer_cache.get(search_svc.mode, q)
+    if cached is not None:
+        print("[SOURCE] cache (" + cached.response["source"] + ")")
+        return cors(jsonify(dict(cached.response, cached=True,
+                                 cache_age_seconds=round(time.time() - cached.created, 1))))
+
+    if ASK_EXECUTION == "concurrent":
+        resp, complete = _ask_concurrent(q)
+    else:
+        resp, complete = _ask_sequential(q)
+    # an answer picked because a higher tier missed the deadline is not cached
+    if complete:
+        answer_cache.put(search_svc.mode, q, resp)
+    return cors(jsonify(dict(resp, cached=False)))
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/ask/stream", methods=["POST", "OPTIONS"])
+def ask_stream():
+    """Same tier cascade as /ask, streamed as Server-Sent Events.
+
+    Events: `contexts` (retrieved chunks, sent as soon as retrieval is done),
+    `token` (incremental synthesis output), `answer` (a complete answer from a
+    non-streaming tier), `done` (source/confidence). If the client goes away
+    mid-stream the generator is closed and the synthesis process is killed.
+    """
+    if request.method == "OPTIONS":
+        return cors(make_response("", 204))
+
+    data = request.get_json(silent=True) or {}
+    q_raw = data.get("question") or ""
+    q = normalize_question(q_raw)
+
+    def answer(resp, cache: bool = True):
+        if cache:
+            answer_cache.put(search_svc.mode, q, resp)
+        if resp.get("contexts"):
+            yield _sse("contexts", {"contexts": resp["contexts"]})
+        yield _sse("answer", resp)
+        yield _sse("done", {"source": resp["source"], "confidence": resp["confidence"]})
+
+    def events():
+        cached = answer_cache.get(search_svc.mode, q)
+        if cached is not None:
+            print("[SOURCE] cache (" + cached.response["source"] + ")")
+            yield from answer(dict(cached.response, cached=True,
+                                   cache_age_seconds=round(time.time() - cached.created, 1)), cache=False)
+            return
+
+        memo = RequestMemo()
+        resp = _pre_kb_tiers(q, memo)
+        if resp is not None:
+            yield from answer(resp)
+            return
+
+        if search_svc.streams_synthesis():
+            contexts = search_svc.retrieve_contexts(q)
+            if contexts:
+                print("[SOURCE] " + search_svc.mode + "+claude (stream)")
+                yield _sse("contexts", {"contexts": contexts})
+                confidence = search_svc.contexts_confidence(contexts)
+                fallback = None
+                for kind, text in search_svc.synthesize_stream(q_raw, contexts):
+                    if kind == "fallback":
+                        fallback = text
+                        break
+                    yield _sse("token", {"text": text})
+                if fallback is None:
+                    # not cached: a stream cut off at the deadline looks the same as a finished one
+                    yield _sse("done", {"source": search_svc.mode + "+claude", "confidence": max(confidence, 0.75)})
+                    return
+                # no synthesis: the top context is only an answer if /ask would accept it too
+                if fallback and confidence >= KB_MIN_CONFIDENCE:
+                    answer_cache.put(search_svc.mode, q, {"answer": fallback, "source": search_svc.mode,
+                                                          "confidence": confidence, "contexts": contexts})
+                    yield _sse("token", {"text": fallback})
+                    yield _sse("done", {"source": search_svc.mode, "confidence": confidence})
+                    return
+        else:
+            resp = _kb_tier_response(search_svc.search_kb(q, where=None))
+            if resp is not None:
+                yield from answer(resp)
+                return
+
+        yield from answer(_post_kb_tiers(q, memo))
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return cors(Response(events(), mimetype="text/event-stream", headers=headers))
+
+
+_DEVICE_NAME_RE = re.compile(r"\b[a-z]+-\d+\b")
+
+
+def _question_device(q: str):
+    m = _DEVICE_NAME_RE.search(q)
+    return m.group(0) if m else None
+
+
+def _research_logs(device, limit: int = 3):
+    """Logs for /deep-research: the named device's logs from the last
+    DEEP_RESEARCH_LOG_HOURS, then that device's latest, then the latest overall.
+    Each step is an indexed range scan on logs.timestamp."""
+    since = (datetime.utcnow() - timedelta(hours=DEEP_RESEARCH_LOG_HOURS)).isoformat()
+    if device:
+        rows = mgr.query_logs(since=since, device=device, limit=limit)
+        if rows:
+            return rows, f"{device}, last {DEEP_RESEARCH_LOG_HOURS:g}h"
+        rows = mgr.query_logs(device=device, limit=limit)
+        if rows:
+            return rows, device
+    rows = mgr.query_logs(since=since, limit=limit)
+    if rows:
+        return rows, f"last {DEEP_RESEARCH_LOG_HOURS:g}h"
+    return mgr.query_logs(limit=limit), "latest"
 
 
 @app.route("/deep-research", methods=["POST", "OPTIONS"])
@@ -331,8 +794,12 @@ def deep_research():
 
     file_snippet = search_files_fallback(q)
 
-    health = mgr.latest_health()
-    logs = mgr.recent_logs(3)
+    device = _question_device(q)
+    # a named device with telemetry is judged from its rollups; otherwise the latest sample overall
+    load = (mgr.device_load(device, TELEMETRY_BASELINE_HOURS, HEALTH_HIGH_LOAD, TELEMETRY_CURRENT_MINUTES)
+            if device else None)
+    health = None if load else mgr.latest_health()
+    logs, log_scope = _research_logs(device)
 
     probable_causes = []
     recommended = []
@@ -341,12 +808,29 @@ def deep_research():
     if kb_answer:
         probable_causes.append("Known pattern matched in endpoint KB.")
         recommended.append("Follow the standard steps from the KB response.")
-        supporting.append("KB category: %s" % (kb_row["category"],))
+        meta = (kb_res.contexts or [{}])[0].get("metadata") or {}
+        supporting.append("KB category: %s" % (meta.get("category") or "unknown",))
 
     if file_snippet:
         probable_causes.append("User question appears in historical docs or runbooks.")
         supporting.append("Document snippet:\n" + file_snippet)
 
+    if load and load["current"] is None:
+        supporting.append(f"No telemetry from {device} in the last {TELEMETRY_CURRENT_MINUTES:g} minutes "
+                          f"(last sample in minute {load['last_bucket']}).")
+    elif load:
+        cur, base = load["current"], load["baseline"]
+        line = (f"Device load ({device}, minute {load['bucket']}): "
+                f"CPU avg {cur['cpu']['avg']}% / max {cur['cpu']['max']}%, "
+                f"RAM avg {cur['ram']['avg']}% / max {cur['ram']['max']}%")
+        if base:
+            line += (f"; usual over {load['baseline_hours']}h: "
+                     f"CPU p95 {base['cpu']['p95']}%, RAM p95 {base['ram']['p95']}%")
+        supporting.append(line + ".")
+        if load["abnormal"]:
+            probable_causes.append("Abnormal resource usage on %s (%s)." % (device, "; ".join(load["reasons"])))
+            recommended.append("Close heavy apps, reboot, and re-test after load drops.")
+
     if health:
         cpu = health["cpu_usage"]
         ram = health["ram_usage"]
@@ -357,8 +841,9 @@ def deep_research():
             recommended.append("Close heavy apps, reboot, and re-test after load drops.")
 
     if logs:
-        latest_log = logs[0]["log_text"]
-        supporting.append("Recent endpoint log: " + latest_log)
+        supporting.append(
+            f"Recent endpoint logs ({log_scope}):\n" + "\n".join(r["log_text"] for r in logs)
+        )
 
     if not probable_causes:
         probable_causes.append("No strong signals found; issue may be intermittent or outside endpoint scope.")
@@ -382,28 +867,15 @@ def deep_research():
         "source": "deep-research",
         "kb_used": bool(kb_answer),
         "file_used": bool(file_snippet),
-        "health_used": bool(health),
+        "health_used": bool(health or load),
+        "load_abnormal": load["abnormal"] if load else None,
         "logs_used": bool(logs)
     }))
 
 def search_uploaded_files(query):
-    results = []
-    uploads_dir = os.path.join(os.path.dirname(ROOT), "uploads")
-
-    if not os.path.exists(uploads_dir):
-        return []
-
-    for filename in os.listdir(uploads_dir):
-        path = os.path.join(uploads_dir, filename)
-        if not os.path.isfile(path):
-            continue
-        
-        with open(path, "r", errors="ignore") as f:
-            for line in f:
-                if query in line.lower():
-                    results.append(line.strip())
-
-    return results
+    # Answered from the persistent inverted index; refresh() (at most every
+    # UPLOAD_INDEX_REFRESH_INTERVAL seconds) picks up files whose mtime changed.
+    return upload_index.search(query)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+# (category, keywords, symptom phrases, fix) - the vocabulary every generator draws from
+TOPICS = [
+    ("vpn", ["vpn", "tunnel", "remote access"], ["is not connecting", "drops every few minutes", "fails with code 720"],
+     "Check internet connectivity, verify the system clock, restart the VPN client and reload the profile."),
+    ("wifi", ["wifi", "wireless", "ssid"], ["keeps disconnecting", "has no internet", "is very slow"],
+     "Forget and rejoin the SSID, toggle airplane mode, flush DNS and reboot."),
+    ("outlook", ["outlook", "email", "mailbox"], ["is not syncing", "keeps asking for a password", "crashes on start"],
+     "Restart Outlook, run Send/Receive, repair the profile and check mailbox size."),
+    ("performance", ["slow", "lag", "performance"], ["is very slow", "freezes after login", "has high cpu usage"],
+     "Reboot, check CPU/RAM in Task Manager, free disk space and disable heavy startup apps."),
+    ("printer", ["printer", "print queue", "spooler"], ["is not printing", "shows offline", "prints blank pages"],
+     "Restart the spooler service, clear the queue and reinstall the printer driver."),
+    ("smart card", ["smart card", "piv", "badge"], ["is not detected", "reports an invalid certificate", "locks after login"],
+     "Reinsert the card, try another reader, restart smart card services and reboot."),
+    ("bitlocker", ["bitlocker", "recovery key", "encryption"], ["asks for a recovery key", "will not unlock", "is suspended"],
+     "Retrieve the recovery key from the portal, then resume protection and check TPM status."),
+    ("teams", ["teams", "meeting", "camera"], ["has no audio", "cannot share screen", "camera is black"],
+     "Clear the Teams cache, check device permissions and update the client."),
+    ("onedrive", ["onedrive", "sync", "files on demand"], ["is stuck syncing", "shows sync conflicts", "is out of space"],
+     "Pause and resume sync, resolve conflicts and check storage quota."),
+    ("patching", ["windows update", "patch", "reboot pending"], ["fails to install", "is stuck at 0%", "loops on reboot"],
+     "Run the update troubleshooter, clear SoftwareDistribution and retry the patch."),
+]
+DEVICES = ["laptop", "desktop", "surface", "workstation", "thin client"]
+CONTEXTS = ["after the latest update", "when working remotely", "in the office", "on battery", "after a password change",
+            "since this morning", "on the docking station", "for all users on the floor"]
+LEVELS = ["INFO", "INFO", "INFO", "WARN", "ERROR"]
+LOG_MESSAGES = [
+    "VPN tunnel failure code 720", "WiFi unstable, roaming between access points", "Outlook sync delay detected",
+    "CPU usage above threshold for 5 minutes", "print spooler service restarted", "smart card reader not detected",
+    "BitLocker recovery key requested", "Teams media stack reinitialized", "OneDrive sync conflict on file",
+    "Windows Update install failed with 0x80070002", "disk free space below 10%", "agent heartbeat ok",
+]
+FILLER = ("Technicians should record the ticket number, the affected user and the exact error text before "
+          "escalating. Most incidents are resolved by the standard checklist; repeated failures on the same "
+          "device usually point to a hardware or profile problem.")
+
+
+def kb_rows(n: int, seed: int = 0) -> list[tuple[str, str, str, str]]:
+    """n distinct (category, question, answer, keywords) rows for knowledge_base."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        cat, kws, symptoms, fix = TOPICS[i % len(TOPICS)]
+        device = DEVICES[(i // len(TOPICS)) % len(DEVICES)]
+        q = f"Why {kws[0]} on my {device} {rng.choice(symptoms)} {rng.choice(CONTEXTS)}"
+        if i >= len(TOPICS) * len(DEVICES):
+            q += f" (case {i})"
+        rows.append((cat, q + "?", f"{fix} Reference KB-{i:06d}.", ",".join(kws)))
+    return rows
+
+
+def kb_json_entries(n: int, seed: int = 0) -> list[dict]:
+    """n entries in kb.json's format: {"keywords": [...], "answer": "..."}."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        cat, kws, symptoms, fix = TOPICS[i % len(TOPICS)]
+        extra = [f"{kws[0]} {rng.choice(symptoms)}"] + ([f"{cat} {i}"] if i >= len(TOPICS) else [])
+        out.append({"keywords": kws + extra, "answer": f"{fix} (entry {i})"})
+    return out
+
+
+def log_line(rng: random.Random, ts: datetime) -> str:
+    return (f"{ts.isoformat(timespec='seconds')}Z {rng.choice(LEVELS)} {rng.choice(LOG_MESSAGES)} "
+            f"on device LAPTOP-{rng.randrange(1000)}")
+
+
+def write_log_file(path: str, size_bytes: int, seed: int = 0, start: datetime | None = None) -> int:
+    """Write timestamped log lines until the file reaches `size_bytes`; returns the line count."""
+    rng = random.Random(seed)
+    ts = start or datetime(2025, 11, 20)
+    written = lines = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < size_bytes:
+            line = log_line(rng, ts) + "\n"
+            f.write(line)
+            written += len(line)
+            lines += 1
+            ts += timedelta(milliseconds=rng.randrange(50, 2000))
+    return lines
+
+
+def write_doc_file(path: str, size_bytes: int, seed: int = 0) -> None:
+    """Write runbook-style prose (headings, KB-like steps, filler) up to `size_bytes`."""
+    rng = random.Random(seed)
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < size_bytes:
+            cat, kws, symptoms, fix = rng.choice(TOPICS)
+            block = (f"## {cat.title()}: {kws[0]} {rng.choice(symptoms)}\n"
+                     f"When the {rng.choice(DEVICES)} {rng.choice(symptoms)} {rng.choice(CONTEXTS)}: {fix}\n"
+                     f"{FILLER}\n\n")
+            f.write(block)
+            written += len(block)
+
+
+@dataclass
+class Query:
+    kind: str
+    text: str
+
+
+# share of each query kind in a mix
+DEFAULT_MIX = {"kb_question": 0.3, "kb_typo": 0.15, "keyword": 0.15, "log_phrase": 0.25, "miss": 0.15}
+
+
+def _typo(rng: random.Random, text: str) -> str:
+    words = text.split()
+    i = rng.randrange(len(words))
+    w = words[i]
+    if len(w) > 3:
+        j = rng.randrange(1, len(w) - 1)
+        words[i] = w[:j] + w[j + 1] + w[j] + w[j + 2:]
+    return " ".join(words)
+
+
+def query_mix(n: int, rows: list[tuple], seed: int = 0, mix: dict[str, float] | None = None) -> list[Query]:
+    """n queries drawn by weight from `mix`: KB questions (verbatim / with a
+    swapped-letter typo), bare keywords, phrases that occur in the generated
+    logs, and misses that match nothing."""
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds, weights = zip(*mix.items())
+    out = []
+    for kind in rng.choices(kinds, weights=weights, k=n):
+        if kind == "kb_question":
+            text = rng.choice(rows)[1].rstrip("?").lower()
+        elif kind == "kb_typo":
+            text = _typo(rng, rng.choice(rows)[1].rstrip("?").lower())
+        elif kind == "keyword":
+            text = rng.choice(rng.choice(TOPICS)[1])
+        elif kind == "log_phrase":
+            words = rng.choice(LOG_MESSAGES).lower().split()
+            k = min(len(words), rng.randint(2, 4))
+            i = rng.randrange(len(words) - k + 1)
+            text = " ".join(words[i:i + k])
+        else:
+            text = f"quantum {rng.choice(['teleport', 'flux', 'sprocket'])} calibration {rng.randrange(10**6)}"
+        out.append(Query(kind, text))
+    return out
+
+
+@dataclass
+class Workspace:
+    root: str
+    db_path: str
+    kb_json_path: str
+    uploads_dir: str
+    data_dir: str
+    upload_index_path: str
+    chroma_dir: str
+    params: dict = field(default_factory=dict)
+    rows: list = field(default_factory=list)
+
+
+def build_workspace(root: str, kb_rows_n: int = 2000, kb_json_n: int = 200, upload_files: int = 4,
+                    upload_file_bytes: int = 4 << 20, data_files: int = 4, data_file_bytes: int = 1 << 20,
+                    seed: int = 0) -> Workspace:
+    """Lay out a self-contained copy of the app's data under `root`: an
+    assistant.db with `kb_rows_n` KB rows, kb.json, uploads/ (log files) and
+    data/ (runbook text)."""
+    from db_manager import DBManager
+
+    ws = Workspace(
+        root=root,
+        db_path=os.path.join(root, "assistant.db"),
+        kb_json_path=os.path.join(root, "kb.json"),
+        uploads_dir=os.path.join(root, "uploads"),
+        data_dir=os.path.join(root, "data"),
+        upload_index_path=os.path.join(root, "upload_index.json"),
+        chroma_dir=os.path.join(root, "chroma_store"),
+        params={"kb_rows": kb_rows_n, "kb_json_entries": kb_json_n, "upload_files": upload_files,
+                "upload_file_bytes": upload_file_bytes, "data_files": data_files,
+                "data_file_bytes": data_file_bytes, "seed": seed},
+    )
+    os.makedirs(ws.uploads_dir, exist_ok=True)
+    os.makedirs(ws.data_dir, exist_ok=True)
+
+    DBManager(ws.db_path).create_schema()
+    ws.rows = kb_rows(kb_rows_n, seed)
+    conn = sqlite3.connect(ws.db_path)
+    with conn:
+        conn.executemany("INSERT INTO knowledge_base (category, question, answer, keywords) VALUES (?, ?, ?, ?)",
+                         ws.rows)
+    conn.close()
+
+    with open(ws.kb_json_path, "w") as f:
+        json.dump(kb_json_entries(kb_json_n, seed), f)
+    for i in range(upload_files):
+        write_log_file(os.path.join(ws.uploads_dir, f"endpoint_{i:03d}.txt"), upload_file_bytes, seed + i)
+    for i in range(data_files):
+        write_doc_file(os.path.join(ws.data_dir, f"runbook_{i:03d}.txt"), data_file_bytes, seed + 1000 + i)
+    return ws
@@ -0,0 +1,333 @@
+"""Latency/throughput of every /ask tier and SearchService mode on a synthetic corpus.
+
+    python -m bench.run --scale 1,4,16 --out bench-results.json
+    python -m bench.run --scale 1 --compare bench-results.json   # diff against an earlier run
+
+Each scale runs in a fresh process against its own temporary workspace (see
+bench.corpus.build_workspace); config is pointed at that workspace through the
+usual environment variables before anything imports it, so the real
+assistant.db, uploads/ and chroma_store/ are never touched.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from bench.corpus import DEFAULT_MIX, build_workspace, query_mix
+
+# same bar the /ask KB tier applies to SearchService results
+KB_MIN_CONFIDENCE = 0.45
+SEARCH_MODES = ("sqlite", "sqlite_fts", "postgres", "vector", "hybrid")
+
+
+def _pct(sorted_ms: list[float], q: float) -> float | None:
+    if not sorted_ms:
+        return None
+    return round(sorted_ms[min(len(sorted_ms) - 1, max(0, math.ceil(q * len(sorted_ms)) - 1))], 3)
+
+
+def _summary(ms: list[float]) -> dict:
+    s = sorted(ms)
+    return {
+        "mean_ms": round(sum(s) / len(s), 3) if s else None,
+        "p50_ms": _pct(s, 0.50),
+        "p95_ms": _pct(s, 0.95),
+        "p99_ms": _pct(s, 0.99),
+        "max_ms": round(s[-1], 3) if s else None,
+    }
+
+
+def measure(fn, queries, threads: int = 1, repeat: int = 1) -> dict:
+    """Run `fn(query_text)` over the query mix `repeat` times; `fn` returns
+    whether it found an answer. The first call is timed on its own
+    (`first_call_ms`: lazy index builds, cold caches) and excluded from the
+    latency distribution; throughput is calls / wall time across `threads`."""
+    t0 = time.perf_counter()
+    fn(queries[0].text)
+    first_ms = (time.perf_counter() - t0) * 1000
+
+    work = [q for _ in range(repeat) for q in queries]
+
+    def one(q):
+        t = time.perf_counter()
+        hit = bool(fn(q.text))
+        return q.kind, (time.perf_counter() - t) * 1000, hit
+
+    wall0 = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            samples = list(pool.map(one, work))
+    else:
+        samples = [one(q) for q in work]
+    wall = time.perf_counter() - wall0
+
+    by_kind: dict[str, dict] = {}
+    for kind in sorted({k for k, _, _ in samples}):
+        ms = [m for k, m, _ in samples if k == kind]
+        by_kind[kind] = {"n": len(ms), "hits": sum(h for k, _, h in samples if k == kind),
+                         "p50_ms": _pct(sorted(ms), 0.5), "p95_ms": _pct(sorted(ms), 0.95)}
+    return {
+        "calls": len(samples),
+        "threads": threads,
+        "hits": sum(h for _, _, h in samples),
+        "first_call_ms": round(first_ms, 3),
+        "seconds": round(wall, 4),
+        "qps": round(len(samples) / wall, 1) if wall > 0 else None,
+        **_summary([m for _, m, _ in samples]),
+        "by_kind": by_kind,
+    }
+
+
+def _rate(count: int, seconds: float, unit: str) -> dict:
+    return {unit: count, "seconds": round(seconds, 4),
+            f"{unit}_per_sec": round(count / seconds, 1) if seconds > 0 else None}
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, n)) for n in os.listdir(path))
+
+
+def _configure_env(ws, opts: dict) -> None:
+    os.environ.update({
+        "SQLITE_DB_PATH": ws.db_path,
+        "UPLOAD_INDEX_PATH": ws.upload_index_path,
+        "CHROMA_DIR": ws.chroma_dir,
+        "VECTOR_COLLECTION": "bench_kb",
+        "EMBED_WARMUP": "false",
+        "PG_TABLE": opts["pg_table"],
+    })
+    # retrieval is what is measured; synthesis time is the CLI's
+    os.environ.setdefault("CLAUDE_SYNTH", "false")
+
+
+def _load_postgres(svc, rows) -> dict:
+    """(Re)create the bench table on the local Postgres and load the KB rows into it."""
+    from psycopg2.extras import execute_values
+
+    pg = svc._pg_client()
+    t0 = time.perf_counter()
+    with pg._conn() as conn, conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {pg.table}")
+        cur.execute(f"CREATE TABLE {pg.table} (id SERIAL PRIMARY KEY, category TEXT, question TEXT, "
+                    f"answer TEXT, keywords TEXT)")
+        execute_values(cur, f"INSERT INTO {pg.table} (category, question, answer, keywords) VALUES %s", rows)
+    pg.ensure_fulltext()
+    return _rate(len(rows), time.perf_counter() - t0, "rows")
+
+
+def run_scale(opts: dict, scale: int) -> dict:
+    root = tempfile.mkdtemp(prefix=f"bench-x{scale}-", dir=opts["workdir"])
+    try:
+        t0 = time.perf_counter()
+        ws = build_workspace(
+            root,
+            kb_rows_n=opts["kb_rows"] * scale,
+            kb_json_n=opts["kb_json_entries"] * scale,
+            upload_files=opts["upload_files"],
+            upload_file_bytes=int(opts["upload_file_mb"] * scale * (1 << 20)),
+            data_files=opts["data_files"],
+            data_file_bytes=int(opts["data_file_mb"] * scale * (1 << 20)),
+            seed=opts["seed"],
+        )
+        corpus_seconds = time.perf_counter() - t0
+        _configure_env(ws, opts)
+
+        # imported only now: config reads the environment at import time
+        from config import DATA_CHUNK_CHARS, DATA_SEARCH_MIN_SCORE, UPLOAD_SEARCH_MAX_RESULTS
+        from db_manager import DBManager
+        from services.data_index import DataFileIndex
+        from services.kb_json import best_keyword_answer
+        from services.log_ingest import iter_log_rows
+        from services.search_service import SearchService
+        from services.upload_index import UploadIndex
+
+        queries = query_mix(opts["queries"], ws.rows, seed=opts["seed"], mix=opts["mix"])
+        run = {"scale": scale, "params": ws.params, "corpus_build_seconds": round(corpus_seconds, 3),
+               "ingestion": {}, "search": {}, "skipped": {}}
+        ingestion, search, skipped = run["ingestion"], run["search"], run["skipped"]
+
+        # ---------- ingestion ----------
+        uploads = UploadIndex(ws.uploads_dir, ws.upload_index_path, max_results=UPLOAD_SEARCH_MAX_RESULTS)
+        t0 = time.perf_counter()
+        uploads.refresh()
+        ingestion["upload_index"] = _rate(_dir_bytes(ws.uploads_dir), time.perf_counter() - t0, "bytes")
+
+        data = DataFileIndex(ws.data_dir, suffix=".txt", chunk_chars=DATA_CHUNK_CHARS,
+                             min_score=DATA_SEARCH_MIN_SCORE)
+        t0 = time.perf_counter()
+        data.refresh()
+        ingestion["data_index"] = _rate(_dir_bytes(ws.data_dir), time.perf_counter() - t0, "bytes")
+
+        mgr = DBManager(ws.db_path)
+        log_file = os.path.join(ws.uploads_dir, sorted(os.listdir(ws.uploads_dir))[0])
+        with open(log_file, encoding="utf-8") as f:
+            t0 = time.perf_counter()
+            n = mgr.insert_logs_bulk(iter_log_rows(f), batch_size=opts["batch_size"])
+        ingestion["logs"] = _rate(n, time.perf_counter() - t0, "lines")
+
+        devices = max(1, opts["telemetry_devices"])
+        minutes = max(1, opts["telemetry_samples"] * scale // devices)
+        start = datetime(2025, 11, 20)
+
+        def samples():
+            for m in range(minutes):
+                ts = (start + timedelta(minutes=m)).isoformat()
+                for d in range(devices):
+                    yield f"LAPTOP-{d}", (d * 7 + m) % 60 + 5, (d * 3 + m) % 40 + 30, "ok", ts
+
+        t0 = time.perf_counter()
+        n = mgr.insert_health_bulk(samples(), batch_size=opts["batch_size"])
+        ingestion["telemetry"] = _rate(n, time.perf_counter() - t0, "samples")
+
+        # ---------- /ask tiers ----------
+        with open(ws.kb_json_path) as f:
+            kb = json.load(f)
+        tiers = {
+            "search_uploaded_files": lambda q: uploads.search(q),
+            "search_files_fallback": lambda q: data.search(q.lower()),
+            "fuzzy_search_kb": lambda q: (lambda r: r[0] is not None and r[1] >= KB_MIN_CONFIDENCE)(mgr.fuzzy_search_kb(q)),
+            "kb_fallback": lambda q: best_keyword_answer(kb, q),
+        }
+        for name, fn in tiers.items():
+            search[name] = measure(fn, queries, threads=opts["threads"], repeat=opts["repeat"])
+            print(f"[BENCH] x{scale} {name}: p50={search[name]['p50_ms']}ms qps={search[name]['qps']}", flush=True)
+
+        # ---------- SearchService modes ----------
+        svc = SearchService(sqlite_mgr=mgr)
+        vector_ready = False
+        for mode in opts["modes"]:
+            try:
+                if mode == "postgres" and "postgres" not in ingestion:
+                    ingestion["postgres"] = _load_postgres(svc, ws.rows)
+                if mode in ("vector", "hybrid") and not vector_ready:
+                    t0 = time.perf_counter()
+                    res = svc.index_vector_from_sqlite()
+                    ingestion["vector_kb"] = {**_rate(res.get("indexed_chunks", 0), time.perf_counter() - t0, "chunks")}
+                    t0 = time.perf_counter()
+                    res = svc.index_vector_from_dir(ws.uploads_dir)
+                    ingestion["vector_uploads"] = {**_rate(res.get("indexed_chunks", 0), time.perf_counter() - t0, "chunks")}
+                    vector_ready = True
+            except Exception as e:  # backend not installed / not reachable: record and move on
+                skipped[mode] = f"{type(e).__name__}: {e}"
+                continue
+            svc.mode = mode
+
+            def ask_kb(q):
+                res = svc.search_kb(q)
+                return res.answer and res.confidence >= KB_MIN_CONFIDENCE
+
+            key = f"search_service.{mode}"
+            try:
+                search[key] = measure(ask_kb, queries, threads=opts["threads"], repeat=opts["repeat"])
+            except Exception as e:
+                skipped[mode] = f"{type(e).__name__}: {e}"
+                continue
+            print(f"[BENCH] x{scale} {key}: p50={search[key]['p50_ms']}ms qps={search[key]['qps']}", flush=True)
+        return run
+    finally:
+        if not opts["keep"]:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def _git(*args: str) -> str | None:
+    try:
+        out = subprocess.run(["git", *args], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def compare(old: dict, new: dict) -> list[str]:
+    """Per (scale, target): p50 and qps of `new` relative to `old`."""
+    lines = []
+    old_runs = {r["scale"]: r for r in old.get("runs", [])}
+    for run in new.get("runs", []):
+        base = old_runs.get(run["scale"])
+        if base is None:
+            continue
+        for name, cur in run["search"].items():
+            prev = base["search"].get(name)
+            if not prev or not prev.get("p50_ms") or not prev.get("qps"):
+                continue
+            lines.append(f"x{run['scale']:<3} {name:<32} p50 {prev['p50_ms']:>9.3f} -> {cur['p50_ms']:>9.3f} ms "
+                         f"({cur['p50_ms'] / prev['p50_ms']:.2f}x)  qps {prev['qps']:>9.1f} -> {cur['qps']:>9.1f}")
+    return lines
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Benchmark /ask tiers, SearchService modes and ingestion")
+    ap.add_argument("--scale", default="1", help="comma-separated corpus multipliers, e.g. 1,4,16")
+    ap.add_argument("--kb-rows", type=int, default=2000)
+    ap.add_argument("--kb-json-entries", type=int, default=200)
+    ap.add_argument("--upload-files", type=int, default=4)
+    ap.add_argument("--upload-file-mb", type=float, default=2.0)
+    ap.add_argument("--data-files", type=int, default=4)
+    ap.add_argument("--data-file-mb", type=float, default=0.5)
+    ap.add_argument("--telemetry-samples", type=int, default=50000)
+    ap.add_argument("--telemetry-devices", type=int, default=500)
+    ap.add_argument("--batch-size", type=int, default=5000, help="rows per transaction for log/telemetry ingest")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                    help="query kind weights, e.g. kb_question=0.5,miss=0.5")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--threads", type=int, default=1)
+    ap.add_argument("--modes", default=",".join(SEARCH_MODES))
+    ap.add_argument("--pg-table", default="bench_knowledge_base",
+                    help="Postgres table to (re)create for the postgres mode; never the app's own table")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--workdir", default=None, help="parent for temporary workspaces (default: system temp)")
+    ap.add_argument("--keep", action="store_true", help="keep the generated workspaces")
+    ap.add_argument("--out", default="bench-results.json")
+    ap.add_argument("--compare", default=None, help="earlier results JSON to diff against")
+    args = ap.parse_args(argv)
+
+    opts = {k: v for k, v in vars(args).items() if k not in ("scale", "out", "compare")}
+    opts["mix"] = {k: float(v) for k, v in (p.split("=") for p in args.mix.split(",") if p)}
+    opts["modes"] = [m.strip() for m in args.modes.split(",") if m.strip()]
+    if args.pg_table == os.getenv("PG_TABLE", "knowledge_base"):
+        ap.error("--pg-table must not be the app's PG_TABLE (the bench drops and recreates it)")
+    scales = [int(s) for s in args.scale.split(",") if s.strip()]
+
+    started = datetime.now().isoformat(timespec="seconds")
+    runs = []
+    ctx = multiprocessing.get_context("spawn")
+    for scale in scales:
+        # one process per scale: config and backend clients bind to its workspace
+        with ctx.Pool(1) as pool:
+            runs.append(pool.apply(run_scale, (opts, scale)))
+
+    result = {
+        "meta": {
+            "started": started,
+            "git_commit": _git("rev-parse", "HEAD"),
+            "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": {**opts, "scales": scales},
+        },
+        "runs": runs,
+    }
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"[BENCH] wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(json.load(f), result)) or "[BENCH] nothing comparable")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,25 +12,96 @@ BASE_DIR = Path(__file__).resolve().parent
 UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", str(BASE_DIR / "uploads")))
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Line-level inverted index over the repo-root uploads/ dir (used by /ask tier 1)
+UPLOAD_INDEX_PATH = Path(os.getenv("UPLOAD_INDEX_PATH", str(BASE_DIR / "upload_index.json")))
+UPLOAD_SEARCH_MAX_RESULTS = int(os.getenv("UPLOAD_SEARCH_MAX_RESULTS", "50"))
+# searches re-check uploads/ for changed files at most this often (seconds)
+UPLOAD_INDEX_REFRESH_INTERVAL = float(os.getenv("UPLOAD_INDEX_REFRESH_INTERVAL", "1.0"))
+
+# /upload copies the file to disk in pieces of this size (hashing as it goes)
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
 CHROMA_DIR = Path(os.getenv("CHROMA_DIR", str(BASE_DIR / "chroma_store")))
 CHROMA_DIR.mkdir(parents=True, exist_ok=True)
 
+# TF-IDF chunk index over repo-root data/*.txt (/ask data-file tiers, /deep-research);
+# a chunk must reach this cosine score to count as a match
+DATA_CHUNK_CHARS = int(os.getenv("DATA_CHUNK_CHARS", "600"))
+DATA_SEARCH_MIN_SCORE = float(os.getenv("DATA_SEARCH_MIN_SCORE", "0.3"))
+
+# /search-file: how many file word indexes to keep, and how many closest words to return
+SEARCH_FILE_CACHE_SIZE = int(os.getenv("SEARCH_FILE_CACHE_SIZE", "8"))
+SEARCH_FILE_TOP_N = int(os.getenv("SEARCH_FILE_TOP_N", "5"))
+
 # --- Legacy SQLite DB (current repo uses assistant.db) ---
 SQLITE_DB_PATH = Path(os.getenv("SQLITE_DB_PATH", str(BASE_DIR / "assistant.db")))
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", str(64 * 1024)))
+# connections shared by all request/job threads; more concurrent callers wait for one
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+# serve KB reads from a read-only in-memory copy (new KB rows are added to it in place)
+SQLITE_KB_SNAPSHOT = os.getenv("SQLITE_KB_SNAPSHOT", "false").lower() == "true"
+
+# /logs/ingest: rows per transaction; /deep-research: how far back to look for the device's logs
+LOG_INGEST_BATCH = int(os.getenv("LOG_INGEST_BATCH", "5000"))
+DEEP_RESEARCH_LOG_HOURS = float(os.getenv("DEEP_RESEARCH_LOG_HOURS", "24"))
+
+# /telemetry/ingest: samples per transaction; 1m rollups older than this are pruned.
+# /deep-research flags a device whose latest-minute CPU/RAM average is above
+# HEALTH_HIGH_LOAD or above its own p95 over the last TELEMETRY_BASELINE_HOURS.
+TELEMETRY_BATCH = int(os.getenv("TELEMETRY_BATCH", "5000"))
+TELEMETRY_1M_RETENTION_HOURS = float(os.getenv("TELEMETRY_1M_RETENTION_HOURS", "48"))
+TELEMETRY_BASELINE_HOURS = int(os.getenv("TELEMETRY_BASELINE_HOURS", "24"))
+HEALTH_HIGH_LOAD = float(os.getenv("HEALTH_HIGH_LOAD", "80"))
+# a device whose newest sample is older than this has no "current" load
+TELEMETRY_CURRENT_MINUTES = float(os.getenv("TELEMETRY_CURRENT_MINUTES", "5"))
 
 # --- Mode switch ---
 # sqlite   -> legacy fuzzy search from SQLite (DBManager.fuzzy_search_kb)
+# sqlite_fts -> FTS5 + BM25 ranked search inside assistant.db (DBManager.fts_search_kb)
 # postgres -> use Postgres KB table (same schema as SQLite knowledge_base)
 # vector   -> use Chroma vector DB (local) + optional Claude CLI synthesis
+# hybrid   -> sqlite FTS/BM25 and vector retrieval in parallel, merged with reciprocal rank fusion
 SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "sqlite").lower()
 
 # --- Vector settings ---
 COLLECTION_NAME = os.getenv("VECTOR_COLLECTION", "endpoint_kb")
 TOP_K = int(os.getenv("TOP_K", "5"))
+# LRU of query embeddings shared by /ask and /deep-research (TTL in seconds, 0 = no expiry)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "0"))
+# bulk (re-)indexing: encode in N worker processes (0 = in-process) with this batch size
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# load the embedding model in the background at startup (vector mode) instead of on the first query
+EMBED_WARMUP = os.getenv("EMBED_WARMUP", "true").lower() == "true"
+
+# /ask response cache (0 entries = off; TTL in seconds, 0 = no expiry). data/, uploads/ and
+# kb.json are re-checked for changes at most every ASK_CACHE_WATCH_INTERVAL seconds
+ASK_CACHE_SIZE = int(os.getenv("ASK_CACHE_SIZE", "512"))
+ASK_CACHE_TTL = float(os.getenv("ASK_CACHE_TTL", "300"))
+ASK_CACHE_WATCH_INTERVAL = float(os.getenv("ASK_CACHE_WATCH_INTERVAL", "1.0"))
+
+# /ask tier execution: sequential -> one tier after another (original cascade)
+#                     concurrent -> all tiers in parallel under ASK_DEADLINE seconds,
+#                                   answer still picked in cascade priority order
+ASK_EXECUTION = os.getenv("ASK_EXECUTION", "sequential").lower()
+ASK_DEADLINE = float(os.getenv("ASK_DEADLINE", "15"))
+ASK_FANOUT_WORKERS = int(os.getenv("ASK_FANOUT_WORKERS", "8"))
+
+# background indexing jobs (/vector/index/* -> /vector/jobs/<id>)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
 
 # --- Claude CLI (used only when SEARCH_BACKEND=vector and CLAUDE_SYNTH=true) ---
 CLAUDE_BIN = os.getenv("CLAUDE_BIN", "claude")
 CLAUDE_SYNTH = os.getenv("CLAUDE_SYNTH", "true").lower() == "true"
+# synthesis executor: concurrent CLI processes, per-call deadline (s), max waiting calls,
+# and whether to keep an idle CLI process pre-started per slot
+SYNTH_MAX_CONCURRENCY = int(os.getenv("SYNTH_MAX_CONCURRENCY", "4"))
+SYNTH_TIMEOUT = float(os.getenv("SYNTH_TIMEOUT", "30"))
+SYNTH_MAX_QUEUE = int(os.getenv("SYNTH_MAX_QUEUE", "32"))
+SYNTH_PRESPAWN = os.getenv("SYNTH_PRESPAWN", "false").lower() == "true"
 
 # --- Postgres settings (only when SEARCH_BACKEND=postgres) ---
 PG_HOST = os.getenv("PG_HOST", "localhost")
@@ -39,3 +110,9 @@ PG_DB = os.getenv("PG_DB", "assistant")
 PG_USER = os.getenv("PG_USER", "postgres")
 PG_PASSWORD = os.getenv("PG_PASSWORD", "")
 PG_TABLE = os.getenv("PG_TABLE", "knowledge_base")
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+# auto   -> tsvector/GIN ranked search when the table has been migrated, else LIKE
+# true   -> always full-text (run migrate_pg_fulltext.py first)
+# false  -> always LIKE
+PG_FULLTEXT = os.getenv("PG_FULLTEXT", "auto").lower()
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import itertools
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+_snapshot_ids = itertools.count()
+
+
+class SQLiteConnectionManager:
+    """Bounded pool of long-lived sqlite3 connections.
+
+    Each connection is opened once with WAL journaling and tuned pragmas.
+    sqlite3's per-connection statement cache (`cached_statements`) then keeps
+    the prepared statements for the fixed SQL strings DBManager issues, so
+    repeat queries skip both connection setup and statement compilation.
+
+    At most `pool_size` connections exist; further checkouts wait for one to
+    be returned. A connection that comes back inside a transaction (the caller
+    raised, or never committed) is rolled back first, so it cannot keep
+    holding the write lock while it sits in the pool.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        wal: bool = True,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_kb: int = 64 * 1024,
+        cached_statements: int = 256,
+        busy_timeout_ms: int = 5000,
+        pool_size: int = 8,
+    ):
+        self.db_path = db_path
+        self.wal = wal
+        self.mmap_size = mmap_size
+        self.cache_kb = cache_kb
+        self.cached_statements = cached_statements
+        self.busy_timeout_ms = busy_timeout_ms
+        self.pool_size = pool_size
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, cached_statements=self.cached_statements, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if self.wal:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out for the duration of the block."""
+        with self._slots:
+            try:
+                c = self._idle.get_nowait()
+            except queue.Empty:
+                c = self._open()
+            try:
+                yield c
+            finally:
+                try:
+                    if c.in_transaction:
+                        c.rollback()
+                except sqlite3.Error:
+                    c.close()
+                else:
+                    self._idle.put(c)
+
+    def close(self) -> None:
+        """Close the idle connections (checked-out ones return to a fresh pool)."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class KBSnapshot:
+    """Read-only in-memory copy of knowledge_base (and its FTS index).
+
+    The copy lives in a shared-cache memory database that refresh() builds in
+    full under a new name and swaps in, so readers never see a half-copied
+    table. Reader connections are pooled per generation: idle ones of the old
+    generation are closed at the swap, busy ones when they are returned, and
+    at most `max_idle` are kept.
+
+    add_row() applies a single KB insert to the current copy instead of
+    copying the table again. It waits for checked-out readers to finish
+    (shared-cache table locks would otherwise fail their reads).
+    """
+
+    def __init__(self, db_path: str, max_idle: int = 8):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._gate = threading.Condition(self._lock)
+        self._readers = 0
+        self._writing = False
+        self._uri: str | None = None
+        self._keeper: sqlite3.Connection | None = None
+        self._idle: list[sqlite3.Connection] = []
+
+    def refresh(self) -> None:
+        uri = f"file:kb_snapshot_{next(_snapshot_ids)}?mode=memory&cache=shared"
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        keeper.execute("ATTACH DATABASE ? AS src", (self.db_path,))
+        keeper.executescript(
+            """
+            CREATE TABLE knowledge_base (
+                id INTEGER PRIMARY KEY,
+                category TEXT,
+                question TEXT,
+                answer TEXT,
+                keywords TEXT
+            );
+            INSERT INTO knowledge_base SELECT id, category, question, answer, keywords FROM src.knowledge_base;
+
+            CREATE VIRTUAL TABLE knowledge_base_fts USING fts5(
+                category, question, answer, keywords,
+                content='knowledge_base', content_rowid='id'
+            );
+            INSERT INTO knowledge_base_fts (knowledge_base_fts) VALUES ('rebuild');
+            """
+        )
+        keeper.commit()
+        keeper.execute("DETACH DATABASE src")
+        with self._lock:
+            old, idle = self._keeper, self._idle
+            self._uri, self._keeper, self._idle = uri, keeper, []
+        for c in idle:
+            c.close()
+        if old is not None:
+            old.close()
+
+    def add_row(self, row) -> None:
+        """Copy one newly inserted knowledge_base row into the snapshot."""
+        with self._build_lock:  # a first build in flight may or may not have copied the row
+            if self._uri is None:
+                return  # built from the database on first read
+        values = (row["id"], row["category"], row["question"], row["answer"], row["keywords"])
+        with self._gate:
+            while self._writing:
+                self._gate.wait()
+            self._writing = True  # new readers wait from here, so a steady read load cannot starve the insert
+            while self._readers:
+                self._gate.wait()
+            keeper = self._keeper
+        try:
+            with keeper:
+                cur = keeper.execute("INSERT OR IGNORE INTO knowledge_base VALUES (?, ?, ?, ?, ?)", values)
+                if cur.rowcount:
+                    keeper.execute(
+                        "INSERT INTO knowledge_base_fts (rowid, category, question, answer, keywords) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        values,
+                    )
+        finally:
+            with self._gate:
+                self._writing = False
+                self._gate.notify_all()
+
+    @contextmanager
+    def connection(self):
+        """Check a read-only connection to the current generation out for the block."""
+        if self._uri is None:
+            with self._build_lock:
+                if self._uri is None:
+                    self.refresh()
+        with self._gate:
+            while self._writing:
+                self._gate.wait()
+            self._readers += 1
+            uri = self._uri
+            c = self._idle.pop() if self._idle else None
+        try:
+            if c is None:
+                c = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                c.row_factory = sqlite3.Row
+                c.execute("PRAGMA query_only=ON")
+            yield c
+        finally:
+            with self._gate:
+                self._readers -= 1
+                keep = c is not None and uri == self._uri and len(self._idle) < self.max_idle
+                if keep:
+                    self._idle.append(c)
+                self._gate.notify_all()
+            if c is not None and not keep:
+                c.close()
@@ -1,134 +1,472 @@
 
 import os
+import re
 import sqlite3
-from difflib import SequenceMatcher
+from datetime import datetime, timedelta
+
+from db_connections import KBSnapshot, SQLiteConnectionManager
+from fuzzy_index import TrigramIndex
+from health_rollups import HISTOGRAM_RESOLUTIONS, RESOLUTIONS, Rollup, assess_load, bucket_start
 
 class DBManager:
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        wal: bool = True,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_kb: int = 64 * 1024,
+        kb_snapshot: bool = False,
+        pool_size: int = 8,
+    ):
         self.db_path = db_path
+        self._cm = SQLiteConnectionManager(db_path, wal=wal, mmap_size=mmap_size, cache_kb=cache_kb,
+                                           pool_size=pool_size)
+        # optional read-only in-memory copy of the KB, kept current by insert_kb
+        self._snapshot = KBSnapshot(db_path) if kb_snapshot else None
+        self._kb_index: TrigramIndex | None = None
+        self._kb_synced_id = 0  # knowledge_base rows up to this id have been pulled into _kb_index
+        self._fts_ready = False
+        self._logs_ready = False
+        self._telemetry_ready = False
+        self._endpoint_ids: dict[str, int] = {}  # lowercased device_name -> endpoints.id
 
     def _conn(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        # pooled connection, checked out for a `with` block; callers must not close it
+        return self._cm.connection()
+
+    def _kb_conn(self):
+        # KB reads go to the snapshot when one is enabled
+        if self._snapshot is not None:
+            if not self._fts_ready:
+                self.ensure_fts()
+            return self._snapshot.connection()
+        return self._cm.connection()
 
     def create_schema(self):
-        conn = self._conn()
-        cur = conn.cursor()
-        cur.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS knowledge_base (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category TEXT,
-                question TEXT,
-                answer TEXT,
-                keywords TEXT
-            );
-
-            CREATE TABLE IF NOT EXISTS logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                log_text TEXT,
-                timestamp TEXT
-            );
-
-            CREATE TABLE IF NOT EXISTS device_health (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cpu_usage INTEGER,
-                ram_usage INTEGER,
-                status TEXT,
-                timestamp TEXT
-            );
-
-            CREATE TABLE IF NOT EXISTS automation_patterns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                description TEXT,
-                steps TEXT
-            );
-
-            CREATE TABLE IF NOT EXISTS endpoints (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_name TEXT,
-                os_version TEXT,
-                last_seen TEXT,
-                compliance_status TEXT
-            );
-            """
-        )
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            cur = conn.cursor()
+            cur.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS knowledge_base (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    category TEXT,
+                    question TEXT,
+                    answer TEXT,
+                    keywords TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    log_text TEXT,
+                    timestamp TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS device_health (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cpu_usage INTEGER,
+                    ram_usage INTEGER,
+                    status TEXT,
+                    timestamp TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS automation_patterns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT,
+                    description TEXT,
+                    steps TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS endpoints (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    device_name TEXT,
+                    os_version TEXT,
+                    last_seen TEXT,
+                    compliance_status TEXT
+                );
+                """
+            )
+            conn.commit()
+        self.ensure_fts()
+        self.ensure_log_schema()
+        self.ensure_telemetry_schema()
+
+    def ensure_fts(self):
+        """Create the FTS5 index over knowledge_base (plus sync triggers) if it
+        is missing, and backfill it from existing rows."""
+        with self._conn() as conn:
+            cur = conn.cursor()
+            exists = cur.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'knowledge_base_fts'"
+            ).fetchone()
+            if not exists:
+                cur.executescript(
+                    """
+                    CREATE VIRTUAL TABLE knowledge_base_fts USING fts5(
+                        category, question, answer, keywords,
+                        content='knowledge_base', content_rowid='id'
+                    );
+
+                    CREATE TRIGGER IF NOT EXISTS knowledge_base_ai AFTER INSERT ON knowledge_base BEGIN
+                        INSERT INTO knowledge_base_fts (rowid, category, question, answer, keywords)
+                        VALUES (new.id, new.category, new.question, new.answer, new.keywords);
+                    END;
+
+                    CREATE TRIGGER IF NOT EXISTS knowledge_base_ad AFTER DELETE ON knowledge_base BEGIN
+                        INSERT INTO knowledge_base_fts (knowledge_base_fts, rowid, category, question, answer, keywords)
+                        VALUES ('delete', old.id, old.category, old.question, old.answer, old.keywords);
+                    END;
+
+                    CREATE TRIGGER IF NOT EXISTS knowledge_base_au AFTER UPDATE ON knowledge_base BEGIN
+                        INSERT INTO knowledge_base_fts (knowledge_base_fts, rowid, category, question, answer, keywords)
+                        VALUES ('delete', old.id, old.category, old.question, old.answer, old.keywords);
+                        INSERT INTO knowledge_base_fts (rowid, category, question, answer, keywords)
+                        VALUES (new.id, new.category, new.question, new.answer, new.keywords);
+                    END;
+
+                    INSERT INTO knowledge_base_fts (knowledge_base_fts) VALUES ('rebuild');
+                    """
+                )
+                conn.commit()
+        self._fts_ready = True
 
     def insert_kb(self, category: str, question: str, answer: str, keywords: str):
-        conn = self._conn()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO knowledge_base (category, question, answer, keywords) VALUES (?, ?, ?, ?)",
-            (category, question, answer, keywords),
-        )
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO knowledge_base (category, question, answer, keywords) VALUES (?, ?, ?, ?)",
+                (category, question, answer, keywords),
+            )
+            conn.commit()
+            row = cur.execute("SELECT * FROM knowledge_base WHERE id = ?", (cur.lastrowid,)).fetchone()
+        if self._snapshot is not None:
+            self._snapshot.add_row(row)
+        if self._kb_index is not None:
+            self._kb_index.add_row(row)
+
+    def _kb_trigram_index(self) -> TrigramIndex:
+        """Build the trigram index on first use, then pull in rows added since
+        (e.g. by seed_db.py running in another process) by comparing max(id).
+
+        insert_kb adds its own row straight away but does not advance the sync
+        point, so a lower id committed meanwhile by another process is still
+        pulled in on the next sync (the re-read own row is skipped).
+        """
+        if self._kb_index is None:
+            self._kb_index = TrigramIndex()
+        idx = self._kb_index
+        with self._kb_conn() as conn:
+            max_id = conn.execute("SELECT MAX(id) FROM knowledge_base").fetchone()[0] or 0
+            if max_id > self._kb_synced_id:
+                rows = conn.execute(
+                    "SELECT * FROM knowledge_base WHERE id > ? ORDER BY id", (self._kb_synced_id,)
+                ).fetchall()
+                for row in rows:
+                    idx.add_row(row)
+                self._kb_synced_id = max(self._kb_synced_id, max_id)
+        return idx
 
     def fuzzy_search_kb(self, query: str):
         query = (query or "").lower()
-        conn = self._conn()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM knowledge_base")
-        rows = cur.fetchall()
-        conn.close()
+        return self._kb_trigram_index().best(query)
+
+    def fts_search_kb(self, query: str, limit: int = 5):
+        """BM25-ranked full-text search. Returns [(row, confidence), ...] with
+        confidence in [0, 1), best first."""
+        terms = re.findall(r"\w+", (query or "").lower())
+        if not terms:
+            return []
+        if not self._fts_ready:
+            self.ensure_fts()
+        # quote every term so FTS5 operators/punctuation in user text are inert
+        match = " OR ".join(f'"{t}"' for t in terms)
+        with self._kb_conn() as conn:
+            rows = conn.execute(
+                """
+                SELECT kb.*, bm25(knowledge_base_fts, 0.5, 2.0, 1.0, 3.0) AS rank
+                FROM knowledge_base_fts
+                JOIN knowledge_base kb ON kb.id = knowledge_base_fts.rowid
+                WHERE knowledge_base_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (match, limit),
+            ).fetchall()
+        # bm25() is negative (lower is better); squash the magnitude into [0, 1)
+        return [(row, -row["rank"] / (-row["rank"] + 1.0)) for row in rows]
+
+    def ensure_log_schema(self):
+        """Migrate logs for bulk ingestion and time-range queries: add the
+        device_name column if missing and index timestamp and
+        (device_name, timestamp)."""
+        with self._conn() as conn:
+            cols = {r["name"] for r in conn.execute("PRAGMA table_info(logs)")}
+            if "device_name" not in cols:
+                conn.execute("ALTER TABLE logs ADD COLUMN device_name TEXT")
+            conn.executescript(
+                """
+                CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp);
+                CREATE INDEX IF NOT EXISTS idx_logs_device_timestamp ON logs (device_name COLLATE NOCASE, timestamp);
+                """
+            )
+            conn.commit()
+        self._logs_ready = True
+
+    def insert_logs_bulk(self, rows, batch_size: int = 5000) -> int:
+        """Insert (log_text, timestamp, device_name) tuples from any iterable.
+
+        Rows are written with executemany, one transaction (and so one WAL
+        sync) per `batch_size` rows, so a large stream is flushed as it
+        arrives without holding it all in memory. Returns the row count.
+        """
+        if not self._logs_ready:
+            self.ensure_log_schema()
+        with self._conn() as conn:
+            sql = "INSERT INTO logs (log_text, timestamp, device_name) VALUES (?, ?, ?)"
+            total = 0
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    with conn:
+                        conn.executemany(sql, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                with conn:
+                    conn.executemany(sql, batch)
+                total += len(batch)
+        return total
+
+    def query_logs(self, since: str | None = None, until: str | None = None,
+                   device: str | None = None, limit: int = 50):
+        """Newest-first logs with since <= timestamp < until, optionally for one
+        device (case-insensitive). Served from the timestamp indexes."""
+        if not self._logs_ready:
+            self.ensure_log_schema()
+        clauses, params = [], []
+        if device:
+            clauses.append("device_name = ? COLLATE NOCASE")
+            params.append(device)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        params.append(limit)
+        with self._conn() as conn:
+            return conn.execute(f"SELECT * FROM logs {where} ORDER BY timestamp DESC LIMIT ?", params).fetchall()
+
+    def ensure_telemetry_schema(self):
+        """Link device_health samples to endpoints and create health_rollups:
+        per endpoint, 1m buckets of CPU/RAM min/max/sum and 1h buckets that
+        also keep p95 and a per-percent histogram (so they merge exactly)."""
+        with self._conn() as conn:
+            cols = {r["name"] for r in conn.execute("PRAGMA table_info(device_health)")}
+            if "endpoint_id" not in cols:
+                conn.execute("ALTER TABLE device_health ADD COLUMN endpoint_id INTEGER REFERENCES endpoints(id)")
+            conn.executescript(
+                """
+                CREATE INDEX IF NOT EXISTS idx_endpoints_device_name ON endpoints (device_name COLLATE NOCASE);
+                CREATE INDEX IF NOT EXISTS idx_device_health_endpoint_ts ON device_health (endpoint_id, timestamp);
+
+                CREATE TABLE IF NOT EXISTS health_rollups (
+                    endpoint_id INTEGER NOT NULL REFERENCES endpoints(id),
+                    resolution TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    samples INTEGER NOT NULL,
+                    cpu_min REAL, cpu_max REAL, cpu_sum REAL, cpu_p95 REAL, cpu_hist BLOB,
+                    ram_min REAL, ram_max REAL, ram_sum REAL, ram_p95 REAL, ram_hist BLOB,
+                    PRIMARY KEY (endpoint_id, resolution, bucket_start)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_health_rollups_age ON health_rollups (resolution, bucket_start);
+                """
+            )
+            conn.commit()
+        self._telemetry_ready = True
+
+    def endpoint_id(self, device: str) -> int | None:
+        key = device.lower()
+        eid = self._endpoint_ids.get(key)
+        if eid is None:
+            if not self._telemetry_ready:
+                self.ensure_telemetry_schema()
+            with self._conn() as conn:
+                row = conn.execute(
+                    "SELECT id FROM endpoints WHERE device_name = ? COLLATE NOCASE ORDER BY id LIMIT 1", (device,)
+                ).fetchone()
+            if row is None:
+                return None
+            eid = self._endpoint_ids[key] = row["id"]
+        return eid
+
+    def insert_health_bulk(self, samples, batch_size: int = 5000) -> int:
+        """Insert (device_name, cpu, ram, status, timestamp) samples from any
+        iterable and fold them into health_rollups; returns the count.
+
+        Each batch is one write transaction: unknown devices are added to
+        endpoints, raw rows are written with executemany, and samples are
+        grouped per (endpoint, bucket) in memory so every touched rollup row
+        is read, merged and written once per batch rather than per sample.
+        """
+        if not self._telemetry_ready:
+            self.ensure_telemetry_schema()
+        total = 0
+        batch = []
+        for sample in samples:
+            batch.append(sample)
+            if len(batch) >= batch_size:
+                total += self._write_health_batch(batch)
+                batch = []
+        if batch:
+            total += self._write_health_batch(batch)
+        return total
+
+    def _write_health_batch(self, batch) -> int:
+        with self._conn() as conn:
+            new_ids: dict[str, int] = {}
+            conn.execute("BEGIN IMMEDIATE")  # rollup read-merge-write must not interleave
+            try:
+                rows = []
+                last_seen: dict[int, str] = {}
+                rollups: dict[tuple, Rollup] = {}
+                for device, cpu, ram, status, ts in batch:
+                    key = device.lower()
+                    eid = self._endpoint_ids.get(key) or new_ids.get(key)
+                    if eid is None:
+                        eid = new_ids[key] = self._get_or_add_endpoint(conn, device, ts)
+                    rows.append((cpu, ram, status, ts, eid))
+                    if ts > last_seen.get(eid, ""):
+                        last_seen[eid] = ts
+                    for res in RESOLUTIONS:
+                        rk = (eid, res, bucket_start(ts, res))
+                        r = rollups.get(rk)
+                        if r is None:
+                            r = rollups[rk] = Rollup(hist=res in HISTOGRAM_RESOLUTIONS)
+                        r.add(cpu, ram)
+                conn.executemany(
+                    "INSERT INTO device_health (cpu_usage, ram_usage, status, timestamp, endpoint_id) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                out = []
+                for rk in sorted(rollups):
+                    r = rollups[rk]
+                    old = conn.execute(
+                        "SELECT * FROM health_rollups WHERE endpoint_id = ? AND resolution = ? AND bucket_start = ?", rk
+                    ).fetchone()
+                    if old is not None:
+                        merged = Rollup.from_row(old)
+                        merged.merge(r)
+                        r = merged
+                    out.append(rk + r.to_columns())
+                conn.executemany(
+                    "INSERT OR REPLACE INTO health_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", out
+                )
+                conn.executemany(
+                    "UPDATE endpoints SET last_seen = ? WHERE id = ? AND (last_seen IS NULL OR last_seen < ?)",
+                    [(ts, eid, ts) for eid, ts in last_seen.items()],
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        self._endpoint_ids.update(new_ids)  # only ids that were committed
+        return len(rows)
 
-        best = None
-        best_score = 0.0
+    def _get_or_add_endpoint(self, conn: sqlite3.Connection, device: str, seen: str) -> int:
+        row = conn.execute(
+            "SELECT id FROM endpoints WHERE device_name = ? COLLATE NOCASE ORDER BY id LIMIT 1", (device,)
+        ).fetchone()
+        if row is not None:
+            return row["id"]
+        cur = conn.execute("INSERT INTO endpoints (device_name, last_seen) VALUES (?, ?)", (device, seen))
+        return cur.lastrowid
 
-        def sim(a, b):
-            return SequenceMatcher(None, a, b).ratio()
+    def health_rollups(self, device: str, resolution: str = "1h", since: str | None = None,
+                       until: str | None = None, limit: int = 48):
+        """Newest-first rollup rows of one device (primary-key range scan)."""
+        eid = self.endpoint_id(device)
+        if eid is None:
+            return []
+        sql = "SELECT * FROM health_rollups WHERE endpoint_id = ? AND resolution = ?"
+        params: list = [eid, resolution]
+        if since:
+            sql += " AND bucket_start >= ?"
+            params.append(since)
+        if until:
+            sql += " AND bucket_start < ?"
+            params.append(until)
+        params.append(limit)
+        with self._conn() as conn:
+            return conn.execute(sql + " ORDER BY bucket_start DESC LIMIT ?", params).fetchall()
 
-        for row in rows:
-            keys = (row["keywords"] or "").split(",")
-            for kw in keys:
-                s = sim(query, kw.strip().lower())
-                if s > best_score:
-                    best_score = s
-                    best = row
+    def device_load(self, device: str, baseline_hours: int = 24, high: float = 80.0,
+                    max_age_minutes: float = 5.0, now: datetime | None = None):
+        """Is the device's load abnormal right now? Compares its latest 1m
+        rollup with its own 1h rollups over the preceding `baseline_hours`
+        (see health_rollups.assess_load). Reads at most 1 + baseline_hours
+        rollup rows however many raw samples exist.
 
-            s = sim(query, (row["question"] or "").lower())
-            if s > best_score:
-                best_score = s
-                best = row
+        None for an unknown device. If the latest minute is older than
+        `max_age_minutes`, there is no current load: the result has
+        "current": None and "abnormal": None, plus when it was last seen.
+        """
+        latest = self.health_rollups(device, "1m", limit=1)
+        if not latest:
+            return None
+        bucket = latest[0]["bucket_start"]
+        now = now or datetime.utcnow()
+        if datetime.fromisoformat(bucket) < now - timedelta(minutes=max_age_minutes):
+            return {"abnormal": None, "reasons": [], "current": None, "baseline": None,
+                    "device": device, "bucket": None, "last_bucket": bucket, "baseline_hours": baseline_hours}
+        hour = bucket_start(bucket, "1h")
+        since = (datetime.fromisoformat(hour) - timedelta(hours=baseline_hours)).isoformat()
+        baseline = None
+        for row in self.health_rollups(device, "1h", since=since, until=hour, limit=baseline_hours):
+            if baseline is None:
+                baseline = Rollup.from_row(row)
+            else:
+                baseline.merge(Rollup.from_row(row))
+        result = assess_load(Rollup.from_row(latest[0]), baseline, high=high)
+        result.update(device=device, bucket=bucket, last_bucket=bucket, baseline_hours=baseline_hours)
+        return result
 
-        return best, best_score
+    def prune_health_rollups(self, resolution: str, before: str) -> int:
+        with self._conn() as conn, conn:
+            cur = conn.execute(
+                "DELETE FROM health_rollups WHERE resolution = ? AND bucket_start < ?", (resolution, before)
+            )
+        return cur.rowcount
 
     def insert_log(self, text: str, timestamp: str):
-        conn = self._conn()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO logs (log_text, timestamp) VALUES (?, ?)",
-            (text, timestamp),
-        )
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO logs (log_text, timestamp) VALUES (?, ?)",
+                (text, timestamp),
+            )
+            conn.commit()
 
     def latest_health(self):
-        conn = self._conn()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM device_health ORDER BY id DESC LIMIT 1")
-        row = cur.fetchone()
-        conn.close()
-        return row
+        with self._conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM device_health ORDER BY id DESC LIMIT 1")
+            row = cur.fetchone()
+            return row
 
     def insert_health(self, cpu: int, ram: int, status: str, timestamp: str):
-        conn = self._conn()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO device_health (cpu_usage, ram_usage, status, timestamp) VALUES (?, ?, ?, ?)",
-            (cpu, ram, status, timestamp),
-        )
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO device_health (cpu_usage, ram_usage, status, timestamp) VALUES (?, ?, ?, ?)",
+                (cpu, ram, status, timestamp),
+            )
+            conn.commit()
 
     def recent_logs(self, limit: int = 5):
-        conn = self._conn()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM logs ORDER BY id DESC LIMIT ?", (limit,))
-        rows = cur.fetchall()
-        conn.close()
-        return rows
+        with self._conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM logs ORDER BY id DESC LIMIT ?", (limit,))
+            rows = cur.fetchall()
+            return rows
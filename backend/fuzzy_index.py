@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+from difflib import SequenceMatcher
+
+_WS_RE = re.compile(r"\s+")
+
+
+def trigrams(text: str) -> set[str]:
+    # Whitespace is dropped before slicing so "wi fi" and "wifi" share grams.
+    compact = _WS_RE.sub("", text)
+    return {compact[i:i + 3] for i in range(len(compact) - 2)}
+
+
+class TrigramIndex:
+    """In-memory trigram index over KB keywords and questions. Only the
+    `max_candidates` entries sharing the most trigrams with a query are scored
+    (exact SequenceMatcher ratio), so weak matches can differ from a full scan."""
+
+    def __init__(self, max_candidates: int = 256):
+        self.max_candidates = max_candidates
+        self._lock = threading.Lock()
+        self.rows: list = []
+        self.entries: list[tuple[str, int]] = []  # (text, row index)
+        self.order: list[tuple[int, int]] = []  # per entry: (row id, position in row), for ties
+        self.grams: dict[str, list[int]] = {}
+        self.short: list[int] = []  # entries too short to have a trigram
+        self.ids: set[int] = set()
+
+    def add_row(self, row) -> bool:
+        """Index `row`; False if its id is already indexed."""
+        with self._lock:
+            if row["id"] in self.ids:
+                return False
+            self.ids.add(row["id"])
+            ri = len(self.rows)
+            self.rows.append(row)
+            texts = [kw.strip().lower() for kw in (row["keywords"] or "").split(",")]
+            texts.append((row["question"] or "").lower())
+            for k, text in enumerate(texts):
+                eid = len(self.entries)
+                self.entries.append((text, ri))
+                self.order.append((row["id"] or 0, k))
+                grams = trigrams(text)
+                if not grams:
+                    self.short.append(eid)
+                for g in grams:
+                    self.grams.setdefault(g, []).append(eid)
+            return True
+
+    def _candidates(self, q_grams: set[str]) -> list[int]:
+        if not q_grams:
+            return list(range(len(self.entries)))
+        overlap: dict[int, int] = {}
+        for g in q_grams:
+            for eid in self.grams.get(g, ()):
+                overlap[eid] = overlap.get(eid, 0) + 1
+        ranked = heapq.nsmallest(self.max_candidates, overlap, key=lambda e: (-overlap[e], self.order[e]))
+        return ranked + self.short
+
+    def best(self, query: str):
+        with self._lock:
+            cands = self._candidates(trigrams(query))
+            entries = self.entries
+            order = self.order
+            rows = self.rows
+
+        best_eid = -1
+        best_score = 0.0
+        # the query sits in seq2 once (its char counts are cached there); both
+        # bounds are symmetric, so they hold for ratio(query, text) as well
+        bound = SequenceMatcher(None, "", query)
+        for eid in cands:
+            text, _ = entries[eid]
+            bound.set_seq1(text)
+            # bounded early exit: each bound is >= ratio(), so stop as soon
+            # as one of them cannot beat (or tie earlier than) the best so far
+            if not self._may_beat(bound.real_quick_ratio(), eid, best_score, best_eid, order):
+                continue
+            if not self._may_beat(bound.quick_ratio(), eid, best_score, best_eid, order):
+                continue
+            s = SequenceMatcher(None, query, text).ratio()
+            if self._may_beat(s, eid, best_score, best_eid, order) and (s > best_score or best_eid >= 0):
+                best_score = s
+                best_eid = eid
+
+        if best_eid < 0:
+            return None, best_score
+        return rows[entries[best_eid][1]], best_score
+
+    @staticmethod
+    def _may_beat(score: float, eid: int, best_score: float, best_eid: int, order: list) -> bool:
+        if best_eid < 0:
+            return True
+        return score > best_score or (score == best_score and order[eid] < order[best_eid])
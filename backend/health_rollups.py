@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import math
+import operator
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+# resolution -> length of the ISO timestamp prefix that identifies its bucket
+RESOLUTIONS = {"1m": 16, "1h": 13}
+_BUCKET_SUFFIX = {"1m": ":00", "1h": ":00:00"}
+METRICS = ("cpu", "ram")
+# resolutions whose rows keep a histogram (and so a p95)
+HISTOGRAM_RESOLUTIONS = {"1h"}
+_BINS = 101  # one bin per whole percent, 0..100
+
+
+def bucket_start(timestamp: str, resolution: str) -> str:
+    """Start of the bucket holding an ISO timestamp ('2025-11-20T10:05:13' ->
+    '2025-11-20T10:05:00' for 1m); a prefix slice, as stored timestamps are
+    normalized to naive UTC."""
+    return timestamp[: RESOLUTIONS[resolution]] + _BUCKET_SUFFIX[resolution]
+
+
+def _bin(value: float) -> int:
+    return min(_BINS - 1, max(0, int(round(value))))
+
+
+class MetricStats:
+    """min/max/sum/count of one metric plus, optionally, a per-percent
+    histogram, so percentiles stay exact for whole-percent samples and two
+    buckets merge by adding their histograms. Without a histogram (1m rows,
+    where 404 bytes per metric would dominate storage) there is no p95."""
+
+    __slots__ = ("n", "min", "max", "sum", "hist")
+
+    def __init__(self, hist: bool = True):
+        self.n = 0
+        self.min: float | None = None
+        self.max: float | None = None
+        self.sum = 0.0
+        self.hist = array("I", bytes(4 * _BINS)) if hist else None
+
+    def add(self, value: float) -> None:
+        self.n += 1
+        self.sum += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+        if self.hist is not None:
+            self.hist[_bin(value)] += 1
+
+    def merge(self, other: "MetricStats") -> None:
+        if not other.n:
+            return
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.n += other.n
+        self.sum += other.sum
+        if self.hist is None or other.hist is None:
+            self.hist = None
+        else:
+            self.hist = array("I", map(operator.add, self.hist, other.hist))
+
+    def percentile(self, q: float) -> float | None:
+        if not self.n or self.hist is None:
+            return None
+        rank = max(1, math.ceil(q * self.n))
+        return float(min(_BINS - 1, bisect_left(list(accumulate(self.hist)), rank)))
+
+    def summary(self) -> dict:
+        if not self.n:
+            return {"min": None, "avg": None, "max": None, "p95": None}
+        return {
+            "min": self.min,
+            "avg": round(self.sum / self.n, 2),
+            "max": self.max,
+            "p95": self.percentile(0.95),
+        }
+
+    @classmethod
+    def from_columns(cls, n: int, lo, hi, total, hist: bytes | None) -> "MetricStats":
+        m = cls(hist=hist is not None)
+        m.n, m.min, m.max, m.sum = n, lo, hi, total
+        if hist is not None:
+            m.hist = array("I")
+            m.hist.frombytes(hist)
+        return m
+
+
+class Rollup:
+    """Aggregates of one endpoint's samples in one bucket (histograms on 1h
+    buckets only, see HISTOGRAM_RESOLUTIONS)."""
+
+    __slots__ = ("cpu", "ram")
+
+    def __init__(self, hist: bool = True):
+        self.cpu = MetricStats(hist)
+        self.ram = MetricStats(hist)
+
+    @property
+    def samples(self) -> int:
+        return self.cpu.n
+
+    def add(self, cpu: float, ram: float) -> None:
+        self.cpu.add(cpu)
+        self.ram.add(ram)
+
+    def merge(self, other: "Rollup") -> None:
+        self.cpu.merge(other.cpu)
+        self.ram.merge(other.ram)
+
+    def to_columns(self) -> tuple:
+        """(samples, then min/max/sum/p95/hist for cpu and ram), as in health_rollups."""
+        cols: list = [self.samples]
+        for m in (self.cpu, self.ram):
+            cols += [m.min, m.max, m.sum, m.percentile(0.95), m.hist.tobytes() if m.hist is not None else None]
+        return tuple(cols)
+
+    @classmethod
+    def from_row(cls, row) -> "Rollup":
+        r = cls()
+        n = row["samples"]
+        r.cpu = MetricStats.from_columns(n, row["cpu_min"], row["cpu_max"], row["cpu_sum"], row["cpu_hist"])
+        r.ram = MetricStats.from_columns(n, row["ram_min"], row["ram_max"], row["ram_sum"], row["ram_hist"])
+        return r
+
+    def summary(self) -> dict:
+        return {"samples": self.samples, "cpu": self.cpu.summary(), "ram": self.ram.summary()}
+
+
+def assess_load(current: Rollup, baseline: Rollup | None, high: float = 80.0,
+                min_baseline_samples: int = 30) -> dict:
+    """Is the current (1m) load abnormal? Yes when its average CPU or RAM is
+    above `high`, or above the device's own p95 over the baseline window
+    (once that window holds enough samples to be meaningful)."""
+    reasons = []
+    for metric in METRICS:
+        cur = getattr(current, metric)
+        if not cur.n:
+            continue
+        avg = cur.sum / cur.n
+        if avg > high:
+            reasons.append(f"{metric.upper()} avg {avg:.0f}% > {high:g}%")
+        if baseline is not None and baseline.samples >= min_baseline_samples:
+            p95 = getattr(baseline, metric).percentile(0.95)
+            if p95 is not None and avg > p95:
+                reasons.append(f"{metric.upper()} avg {avg:.0f}% > usual p95 {p95:.0f}%")
+    return {
+        "abnormal": bool(reasons),
+        "reasons": reasons,
+        "current": current.summary(),
+        "baseline": baseline.summary() if baseline is not None else None,
+    }
@@ -0,0 +1,20 @@
+import sys
+
+from config import PG_HOST, PG_PORT, PG_DB, PG_USER, PG_PASSWORD, PG_TABLE
+from services.postgres_manager import PostgresKB
+
+def main():
+    pg = PostgresKB(host=PG_HOST, port=PG_PORT, dbname=PG_DB, user=PG_USER, password=PG_PASSWORD, table=PG_TABLE)
+    print(f"Upgrading {PG_TABLE} on {PG_HOST}:{PG_PORT}/{PG_DB} (tsvector column + GIN index)...")
+    pg.ensure_fulltext()
+    print("Full-text column/index created/verified.")
+
+    query = " ".join(sys.argv[1:]) or "vpn not connecting"
+    hits = pg.search_fulltext(query, limit=5)
+    print(f"Sample search for {query!r}: {len(hits)} hit(s)")
+    for h in hits:
+        print(f"  [{h['rank']:.3f}] #{h['id']} {h['category']}: {h['question']}")
+    pg.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Stand-in for the Claude CLI when testing synthesis locally.
+
+Reads the prompt from stdin and prints a JSON answer in the shape the real
+prompt asks for, a few characters at a time.
+
+    CLAUDE_BIN=scripts/fake_claude.py FAKE_CLAUDE_DELAY=0.5 python app_db.py
+
+FAKE_CLAUDE_DELAY  seconds to sleep before answering (simulate slow/hung CLI)
+FAKE_CLAUDE_STREAM seconds between output chunks (default 0.02)
+"""
+import json
+import os
+import sys
+import time
+
+prompt = sys.stdin.read()
+time.sleep(float(os.getenv("FAKE_CLAUDE_DELAY", "0")))
+
+question = ""
+lines = prompt.splitlines()
+if "User question:" in lines:
+    question = lines[lines.index("User question:") + 1].strip()
+
+answer = json.dumps({
+    "root_cause": f"(stand-in) likely cause for: {question}",
+    "next_actions": ["Check the retrieved context", "Re-test after the fix"],
+    "followup_questions": ["When did it start?"],
+    "confidence": 0.5,
+})
+step = float(os.getenv("FAKE_CLAUDE_STREAM", "0.02"))
+for i in range(0, len(answer), 8):
+    sys.stdout.write(answer[i:i + 8])
+    sys.stdout.flush()
+    time.sleep(step)
+sys.stdout.write("\n")
@@ -3,9 +3,28 @@ set -euo pipefail
 
 BASE_URL=${BASE_URL:-http://127.0.0.1:5000}
 
+# Indexing runs as a background job; poll its status until it finishes.
+wait_job() {
+  local job_id=$1
+  while true; do
+    local body
+    body=$(curl -s "$BASE_URL/vector/jobs/$job_id")
+    local status
+    status=$(echo "$body" | python -c 'import json,sys; print(json.load(sys.stdin)["job"]["status"])')
+    if [ "$status" = "done" ] || [ "$status" = "error" ]; then
+      echo "$body" | python -m json.tool
+      break
+    fi
+    echo "$body" | python -c 'import json,sys; j=json.load(sys.stdin)["job"]; print("  ", j["status"], j["progress"], "eta:", j.get("eta_seconds"))'
+    sleep 2
+  done
+}
+
 echo "Indexing SQLite KB -> Chroma..."
-curl -s -X POST "$BASE_URL/vector/index/sqlite" | python -m json.tool
+job=$(curl -s -X POST "$BASE_URL/vector/index/sqlite" | python -c 'import json,sys; print(json.load(sys.stdin)["job"]["id"])')
+wait_job "$job"
 
 echo ""
 echo "Indexing uploads -> Chroma..."
-curl -s -X POST "$BASE_URL/vector/index/uploads" | python -m json.tool
+job=$(curl -s -X POST "$BASE_URL/vector/index/uploads" | python -c 'import json,sys; print(json.load(sys.stdin)["job"]["id"])')
+wait_job "$job"
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from vector.cache import LRUCache
+
+# /ask tiers in cascade order; an answer depends on every tier consulted up to
+# (and including) the one that produced it
+TIERS = ("uploads", "data", "kb", "kb-json")
+
+_SOURCE_DEPTH = {
+    "uploaded-file": 1,
+    "data-file": 2,
+    "domain-filter": 2,
+    "rule-wifi-vpn": 2,
+    "files": 3,
+    "kb-json": 4,
+    "none": 4,
+}
+
+
+def tiers_consulted(source: str) -> frozenset[str]:
+    # anything not listed came from the KB tier (sqlite, vector+claude, ...)
+    return frozenset(TIERS[: _SOURCE_DEPTH.get(source, 3)])
+
+
+def normalize_question(question: str) -> str:
+    return " ".join((question or "").lower().split())
+
+
+@dataclass
+class CachedAnswer:
+    response: dict[str, Any]
+    deps: frozenset[str]
+    created: float
+
+
+class AnswerCache:
+    """Bounded TTL cache of /ask responses keyed by (backend, normalized question).
+
+    Entries remember which tiers were consulted, so a change to one source only
+    drops the answers that could have been affected by it. `watch()` stats the
+    data directory and kb.json (at most every `watch_interval` seconds) and
+    invalidates on change.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float | None = 300.0, watch_interval: float = 1.0):
+        self.enabled = maxsize > 0
+        self._cache = LRUCache(maxsize=max(1, maxsize), ttl=ttl)
+        self.watch_interval = watch_interval
+        self._watched: dict[str, tuple[Callable[[], Any], Callable[[], None] | None, str, Any]] = {}
+        self._last_watch = 0.0
+        self._lock = threading.Lock()
+        self.invalidations: dict[str, int] = {}
+
+    def get(self, backend: str, question: str) -> CachedAnswer | None:
+        if not self.enabled:
+            return None
+        self.watch()
+        return self._cache.get((backend, question))
+
+    def put(self, backend: str, question: str, response: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        self._cache.put((backend, question), CachedAnswer(
+            response=response,
+            deps=tiers_consulted(response.get("source", "")),
+            created=time.time(),
+        ))
+
+    def invalidate(self, tier: str, reason: str, pred: Callable[[str, CachedAnswer], bool] | None = None) -> int:
+        """Drop entries that consulted `tier` (and, if given, satisfy pred(question, entry))."""
+        n = self._cache.discard_where(
+            lambda key, entry: tier in entry.deps and (pred is None or pred(key[1], entry))
+        )
+        with self._lock:
+            self.invalidations[reason] = self.invalidations.get(reason, 0) + n
+        if n:
+            print(f"[ASK-CACHE] {reason}: invalidated {n} cached answer(s)")
+        return n
+
+    def questions(self, tier: str) -> list[str]:
+        """Cached questions whose answer consulted `tier`."""
+        return [key[1] for key, entry in self._cache.items() if tier in entry.deps]
+
+    # ---------- source watching ----------
+
+    def watch_source(self, name: str, signature: Callable[[], Any], tier: str,
+                     on_change: Callable[[], None] | None = None) -> None:
+        self._watched[name] = (signature, on_change, tier, signature())
+
+    def resnapshot(self, name: str) -> None:
+        """Record a watched source's current state without invalidating (the
+        caller already invalidated precisely for the change it made)."""
+        signature, on_change, tier, _ = self._watched[name]
+        self._watched[name] = (signature, on_change, tier, signature())
+
+    def watch(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_watch < self.watch_interval:
+                return
+            self._last_watch = now
+        for name, (signature, on_change, tier, last) in list(self._watched.items()):
+            current = signature()
+            if current == last:
+                continue
+            self._watched[name] = (signature, on_change, tier, current)
+            if on_change is not None:
+                on_change()
+            self.invalidate(tier, f"{name}-changed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            invalidations = dict(self.invalidations)
+        return dict(self._cache.stats(), enabled=self.enabled, invalidations=invalidations)
+
+
+def dir_signature(path: str, suffix: str = "") -> tuple:
+    """(name, mtime_ns, size) of every matching file in `path`; changes on add/remove/edit."""
+    if not os.path.isdir(path):
+        return ()
+    out = []
+    for name in sorted(os.listdir(path)):
+        if name.startswith(".") or (suffix and not name.lower().endswith(suffix)):
+            continue
+        try:
+            st = os.stat(os.path.join(path, name))
+        except OSError:
+            continue
+        out.append((name, st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+
+def file_signature(path: str) -> tuple | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+from collections import Counter
+from typing import Iterable, Iterator
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from services.upload_index import tokenize
+from vector.reader import iter_lines, read_span
+
+
+def line_chunks(lines: Iterable[tuple[int, int, str]], max_chars: int = 600) -> Iterator[tuple[int, int, str]]:
+    """Group (start, end, line) pieces into (start, end, text) chunks of at
+    most `max_chars` on line boundaries. Feed it pieces no longer than
+    `max_chars` (see iter_lines' max_bytes), so no line is cut here."""
+    cur: list[str] = []
+    cur_start = cur_end = 0
+    size = 0
+    for start, end, line in lines:
+        if cur and size + len(line) > max_chars:
+            text = "".join(cur)
+            if text.strip():
+                yield cur_start, cur_end, text
+            cur, size = [], 0
+        if not cur:
+            cur_start = start
+        cur.append(line)
+        cur_end = end
+        size += len(line)
+    if cur:
+        text = "".join(cur)
+        if text.strip():
+            yield cur_start, cur_end, text
+
+
+def _tf(count: int) -> float:
+    return 1.0 + math.log(count)
+
+
+class DataFileIndex:
+    """TF-IDF index over line-aligned chunks of the data directory's text files.
+
+    Files are streamed line by line and re-chunked only when their mtime/size
+    changes; only each chunk's byte span and term counts are kept, and the
+    winning chunk's text is read back from the file. The sparse chunk x term
+    matrix (rows L2-normalised) is rebuilt whenever any file changed, so a
+    query costs one sparse mat-vec plus an argmax.
+    """
+
+    def __init__(self, data_dir: str, suffix: str = ".txt", chunk_chars: int = 600, min_score: float = 0.3):
+        self.data_dir = data_dir
+        self.suffix = suffix
+        self.chunk_chars = chunk_chars
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        # name -> ((mtime_ns, size), chunk byte spans, per-chunk term counts)
+        self._files: dict[str, tuple[tuple[int, int], list[tuple[int, int]], list[Counter]]] = {}
+        self._chunks: list[tuple[str, int, int]] = []
+        self._vocab: dict[str, int] = {}
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._matrix = csr_matrix((0, 0), dtype=np.float32)
+
+    def _scan(self) -> bool:
+        """Re-read added/changed files and drop removed ones; True if anything changed."""
+        seen = set()
+        changed = False
+        if os.path.isdir(self.data_dir):
+            for name in os.listdir(self.data_dir):
+                if not name.lower().endswith(self.suffix):
+                    continue
+                path = os.path.join(self.data_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(name)
+                sig = (st.st_mtime_ns, st.st_size)
+                cached = self._files.get(name)
+                if cached and cached[0] == sig:
+                    continue
+                spans: list[tuple[int, int]] = []
+                counts: list[Counter] = []
+                try:
+                    for start, end, text in line_chunks(iter_lines(path, self.chunk_chars), self.chunk_chars):
+                        spans.append((start, end))
+                        counts.append(Counter(tokenize(text)))
+                except OSError:
+                    continue
+                self._files[name] = (sig, spans, counts)
+                changed = True
+        for name in [n for n in self._files if n not in seen]:
+            del self._files[name]
+            changed = True
+        return changed
+
+    def _rebuild(self) -> None:
+        chunks: list[tuple[str, int, int]] = []
+        counts: list[Counter] = []
+        for name in sorted(self._files):
+            _, file_spans, file_counts = self._files[name]
+            chunks.extend((name, start, end) for start, end in file_spans)
+            counts.extend(file_counts)
+
+        df: Counter = Counter()
+        for c in counts:
+            df.update(c.keys())
+        vocab = {t: i for i, t in enumerate(sorted(df))}
+        n = len(counts)
+        idf = np.zeros(len(vocab), dtype=np.float32)
+        for t, i in vocab.items():
+            idf[i] = math.log((1 + n) / (1 + df[t])) + 1.0
+
+        rows: list[int] = []
+        cols: list[int] = []
+        vals: list[float] = []
+        for r, c in enumerate(counts):
+            weights = [(vocab[t], _tf(k) * idf[vocab[t]]) for t, k in c.items()]
+            norm = math.sqrt(sum(w * w for _, w in weights)) or 1.0
+            for col, w in weights:
+                rows.append(r)
+                cols.append(col)
+                vals.append(w / norm)
+
+        self._chunks = chunks
+        self._vocab = vocab
+        self._idf = idf
+        self._matrix = csr_matrix((vals, (rows, cols)), shape=(n, len(vocab)), dtype=np.float32)
+
+    def refresh(self) -> None:
+        with self._lock:
+            if self._scan():
+                self._rebuild()
+
+    def search(self, query: str) -> tuple[str, str, float] | None:
+        """Best (file name, chunk, cosine score) for `query`, or None below min_score."""
+        self.refresh()
+        with self._lock:
+            matrix, vocab, idf, chunks = self._matrix, self._vocab, self._idf, self._chunks
+        if not chunks:
+            return None
+        q = np.zeros(len(vocab), dtype=np.float32)
+        for t, k in Counter(tokenize(query)).items():
+            i = vocab.get(t)
+            if i is not None:
+                q[i] = _tf(k) * idf[i]
+        norm = float(np.linalg.norm(q))
+        if norm == 0.0:
+            return None
+        scores = matrix @ (q / norm)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        if score < self.min_score:
+            return None
+        name, start, end = chunks[best]
+        chunk = read_span(os.path.join(self.data_dir, name), start, end)
+        if chunk is None:
+            return None
+        return name, chunk, score
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": len(self._files), "chunks": len(self._chunks), "terms": len(self._vocab)}
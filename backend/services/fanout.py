@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Hashable, Optional
+
+
+class RequestMemo:
+    """Per-request memo shared by the tiers of one question: the first call for a
+    key runs fn, later calls (from any thread) wait for and reuse its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures: dict[Hashable, Future] = {}
+
+    def call(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            fut = self._futures.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._futures[key] = Future()
+        if owner:
+            try:
+                fut.set_result(fn(*args))
+            except BaseException as e:
+                fut.set_exception(e)
+        return fut.result()
+
+
+Tier = tuple[str, Callable[[], Optional[Any]]]
+
+
+class TierFanout:
+    """Runs /ask tiers concurrently and picks the answer in priority order.
+
+    All tiers are submitted at once; results are then taken in list order, so
+    the highest-priority tier that returns non-None wins exactly as in the
+    sequential cascade. Once a tier wins, lower-priority tiers that have not
+    started are cancelled (running ones finish in the background and their
+    results are discarded). The deadline covers the whole request, queueing
+    behind other requests' tiers included: once it passes, tiers that have not
+    finished are skipped (and cancelled if they never started), and only
+    already-finished ones are considered.
+    """
+
+    def __init__(self, max_workers: int = 8, deadline: float = 15.0):
+        self.deadline = deadline
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ask-tier")
+        self._lock = threading.Lock()
+        self.counts: dict[str, dict[str, int]] = {}
+
+    def _bump(self, tier: str, key: str) -> None:
+        with self._lock:
+            c = self.counts.setdefault(tier, {"wins": 0, "timeouts": 0, "errors": 0, "cancelled": 0})
+            c[key] += 1
+
+    def run(self, tiers: list[Tier], deadline: float | None = None) -> tuple[str | None, Any, bool]:
+        """Returns (winning tier, result, complete). `complete` is False when the
+        deadline cut off a higher-priority tier, i.e. the answer may differ from
+        what the sequential cascade would have produced."""
+        t_end = time.monotonic() + (self.deadline if deadline is None else deadline)
+        futures = [(name, self._pool.submit(fn)) for name, fn in tiers]
+        complete = True
+        try:
+            for name, fut in futures:
+                if not complete and not fut.done():
+                    continue
+                try:
+                    result = fut.result(timeout=max(0.0, t_end - time.monotonic()))
+                except FutureTimeout:
+                    fut.cancel()  # not started by the deadline: never run it
+                    self._bump(name, "timeouts")
+                    complete = False
+                    continue
+                except Exception:
+                    traceback.print_exc()
+                    self._bump(name, "errors")
+                    continue
+                if result is not None:
+                    self._bump(name, "wins")
+                    return name, result, complete
+            return None, None, complete
+        finally:
+            for name, fut in futures:
+                if fut.cancel():
+                    self._bump(name, "cancelled")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"deadline": self.deadline, "tiers": {k: dict(v) for k, v in self.counts.items()}}
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
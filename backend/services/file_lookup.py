@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+from array import array
+from difflib import SequenceMatcher
+
+from vector.cache import LRUCache
+from vector.reader import MAX_LINE_BYTES, iter_lines
+
+_WORD_RE = re.compile(r"\w+")
+# ids, counters, hashes: too many distinct values to be worth a delete index
+_NO_SPELLING_RE = re.compile(r"\w*\d\w*|[0-9a-f]{8,}")
+
+
+def levenshtein(a: str, b: str) -> int:
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def _deletes(word: str, distance: int) -> set[str]:
+    out = {word}
+    frontier = {word}
+    for _ in range(distance):
+        nxt = set()
+        for w in frontier:
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        out |= nxt
+        frontier = nxt
+    return out
+
+
+class FileVocabulary:
+    """Deduplicated word index of one text file.
+
+    The file is streamed (lines longer than MAX_LINE_BYTES count as several).
+
+    - `lines`: word -> line numbers it occurs on (0-based), used both to report
+      where a match is and to narrow exact-substring checks to a few lines
+    - `offsets`: byte offset of every line, so candidate lines are read back
+      with one seek instead of re-reading the file
+    - a SymSpell-style delete index (deletes of each word's first
+      `prefix_length` chars, up to `max_distance`) that yields spelling
+      candidates without comparing the query to every word; words with
+      digits and long hex strings are left out of it
+    """
+
+    def __init__(self, path: str, max_distance: int = 2, prefix_length: int = 7):
+        self.path = path
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.lines: dict[str, array] = {}
+        self.offsets = array("Q")
+        self.deletes: dict[str, list[str]] = {}
+        self._build()
+
+    def _build(self) -> None:
+        for line_no, (start, _, line) in enumerate(iter_lines(self.path)):
+            self.offsets.append(start)
+            for w in set(_WORD_RE.findall(line.lower())):
+                plist = self.lines.get(w)
+                if plist is None:
+                    plist = self.lines[w] = array("I")
+                plist.append(line_no)
+        for w in self.lines:
+            if _NO_SPELLING_RE.fullmatch(w):
+                continue
+            for d in _deletes(w[: self.prefix_length], self.max_distance):
+                self.deletes.setdefault(d, []).append(w)
+
+    def _read_line(self, f, line_no: int) -> str:
+        f.seek(self.offsets[line_no])
+        return f.readline(MAX_LINE_BYTES).decode("utf-8", errors="ignore")
+
+    def find(self, query: str) -> int | None:
+        """First line (0-based) containing `query` (lowercase), or None."""
+        words = _WORD_RE.findall(query)
+        if words:
+            # as in UploadIndex: boundary words may be fragments, inner words are whole
+            cand: set[int] | None = None
+            for i, w in enumerate(words):
+                if len(words) == 1:
+                    vocab = [v for v in self.lines if w in v]
+                elif i == 0:
+                    vocab = [v for v in self.lines if v.endswith(w)]
+                elif i == len(words) - 1:
+                    vocab = [v for v in self.lines if v.startswith(w)]
+                else:
+                    vocab = [w] if w in self.lines else []
+                found: set[int] = set()
+                for v in vocab:
+                    found.update(self.lines[v])
+                cand = found if cand is None else cand & found
+                if not cand:
+                    return None
+            candidates = sorted(cand or ())
+        else:
+            candidates = range(len(self.offsets))  # punctuation-only query
+        with open(self.path, "rb") as f:
+            for line_no in candidates:
+                if query in self._read_line(f, line_no).lower():
+                    return line_no
+        return None
+
+    def _spelling_candidates(self, query: str) -> dict[str, int]:
+        out: dict[str, int] = {}
+        for d in _deletes(query[: self.prefix_length], self.max_distance):
+            for w in self.deletes.get(d, ()):
+                if w in out:
+                    continue
+                dist = levenshtein(query, w)
+                if dist <= self.max_distance:
+                    out[w] = dist
+        return out
+
+    def closest(self, query: str, n: int = 5, max_lines: int = 10) -> list[dict]:
+        """Top-n vocabulary words by SequenceMatcher(None, query, word).ratio()
+        (the baseline's max-ratio match), with line numbers (1-based).
+
+        Words within `max_distance` edits come from the delete index first;
+        they usually score highest, so the n-th best of them is a floor that
+        lets the scan over the rest of the vocabulary skip most words on
+        SequenceMatcher's cheap upper bounds.
+        """
+        ranked: list[tuple[float, int | None, str]] = []
+        spelling = self._spelling_candidates(query) if _WORD_RE.fullmatch(query) else {}
+        for w, dist in spelling.items():
+            ranked.append((SequenceMatcher(None, query, w).ratio(), dist, w))
+        ranked.sort(key=lambda r: (-r[0], r[2]))
+        del ranked[n:]
+        floor = ranked[-1][0] if len(ranked) >= n else 0.0
+        sm = SequenceMatcher(None, query, "")
+        for w in self.lines:
+            if w in spelling:
+                continue
+            sm.set_seq2(w)
+            if sm.real_quick_ratio() < floor or sm.quick_ratio() < floor:
+                continue
+            ranked.append((sm.ratio(), None, w))
+            if len(ranked) > n:
+                ranked.sort(key=lambda r: (-r[0], r[2]))
+                del ranked[n:]
+                floor = ranked[-1][0]
+        ranked.sort(key=lambda r: (-r[0], r[2]))
+        return [
+            {
+                "word": w,
+                "score": round(score, 4),
+                "distance": dist if dist is not None else levenshtein(query, w),
+                "lines": [ln + 1 for ln in self.lines[w][:max_lines]],
+            }
+            for score, dist, w in ranked[:n]
+        ]
+
+
+class FileLookupCache:
+    """FileVocabulary per (path, mtime, size); a changed file gets a fresh entry
+    and the stale one ages out of the LRU. Concurrent requests for the same
+    file version share one build; builds of different files run in parallel."""
+
+    def __init__(self, maxsize: int = 8):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._building: dict[tuple, threading.Lock] = {}
+
+    def get(self, path: str) -> FileVocabulary:
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        vocab = self._cache.get(key)
+        if vocab is not None:
+            return vocab
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        try:
+            with build_lock:
+                vocab = self._cache.get(key)
+                if vocab is None:
+                    vocab = FileVocabulary(path)
+                    self._cache.put(key, vocab)
+        finally:
+            with self._lock:
+                if self._building.get(key) is build_lock:
+                    del self._building[key]
+        return vocab
+
+    def stats(self) -> dict:
+        return self._cache.stats()
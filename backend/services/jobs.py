@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    key: tuple
+    status: str = "queued"  # queued | running | done | error
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    progress: dict[str, Any] = field(default_factory=dict)
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    coalesced: int = 0
+
+    def update(self, **progress) -> None:
+        self.progress.update(progress)
+
+    def to_dict(self) -> dict:
+        now = self.finished or time.time()
+        elapsed = now - self.started if self.started else 0.0
+        out = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "elapsed_seconds": round(elapsed, 2),
+            "progress": dict(self.progress),
+            "coalesced_requests": self.coalesced,
+            "result": self.result,
+            "error": self.error,
+        }
+        chunks = self.progress.get("chunks", 0)
+        if elapsed > 0 and chunks:
+            out["chunks_per_sec"] = round(chunks / elapsed, 1)
+        done, total = self.progress.get("done"), self.progress.get("total")
+        if self.status == "running" and done and total and elapsed > 0:
+            out["eta_seconds"] = round(elapsed / done * (total - done), 1)
+        return out
+
+
+class JobManager:
+    """Background worker pool for long-running indexing work.
+
+    Jobs are coalesced by `key`: submitting a key that already has a queued
+    job returns that job instead of queueing a duplicate. A job that is
+    already running may have read its inputs, so a submit for its key queues
+    a fresh job that runs after it. Jobs sharing a `lock_key` (e.g. the same
+    Chroma collection) never run concurrently.
+    """
+
+    def __init__(self, max_workers: int = 2, keep_finished: int = 100):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+        self._queued: dict[tuple, Job] = {}
+        self._key_locks: dict[Any, threading.Lock] = {}
+        self.keep_finished = keep_finished
+
+    def submit(self, kind: str, key: tuple, fn: Callable[[Job], Any], lock_key: Any = None) -> Job:
+        """Run fn(job) in the background; fn reports progress via job.update()."""
+        with self._lock:
+            queued = self._queued.get(key)
+            if queued is not None:
+                queued.coalesced += 1
+                return queued
+            job = Job(id=uuid.uuid4().hex[:12], kind=kind, key=key)
+            self._jobs[job.id] = job
+            self._queued[key] = job
+            key_lock = self._key_locks.setdefault(lock_key if lock_key is not None else key, threading.Lock())
+            self._prune()
+        self._pool.submit(self._run, job, fn, key_lock)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Any], key_lock: threading.Lock) -> None:
+        with key_lock:
+            with self._lock:
+                # from here on, new submits for this key queue a new job
+                job.status = "running"
+                if self._queued.get(job.key) is job:
+                    del self._queued[job.key]
+            job.started = time.time()
+            try:
+                job.result = fn(job)
+                job.status = "done"
+            except Exception as e:
+                traceback.print_exc()
+                job.error = str(e)
+                job.status = "error"
+            finally:
+                job.finished = time.time()
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if j.finished is not None]
+        for j in sorted(finished, key=lambda j: j.finished)[: max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[j.id]
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        return sorted(self._jobs.values(), key=lambda j: j.created, reverse=True)
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from difflib import SequenceMatcher
+
+
+def best_keyword_answer(kb: list[dict], query: str, min_score: float = 0.6) -> str | None:
+    """Answer of the kb.json entry whose keyword is most similar to `query`
+    (SequenceMatcher ratio), if that similarity exceeds `min_score`."""
+    query = query.lower()
+    best = None
+    best_score = 0.0
+    for entry in kb:
+        for kw in entry["keywords"]:
+            s = SequenceMatcher(None, query, kw.lower()).ratio()
+            if s > best_score:
+                best_score = s
+                best = entry
+    if best and best_score > min_score:
+        return best["answer"]
+    return None
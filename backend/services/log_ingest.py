@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+import re
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator
+
+# "2025-11-20T10:05Z ERROR ..." / "2025-11-20 10:05:13.120 ..."
+_LEADING_TS_RE = re.compile(
+    r"(\d{4}-\d{2}-\d{2}([T ])\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?)(Z|[+-]\d{2}:?\d{2})?\s+"
+)
+# "... on device LAPTOP-123", "host=LAPTOP-123"
+_DEVICE_RE = re.compile(r"(?:device|host)[\s=:]+([A-Za-z0-9][\w.-]*)", re.IGNORECASE)
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def normalize_timestamp(value: Any, default: str) -> str:
+    """ISO-8601 UTC without offset (the format seed_db.py writes), so stored
+    timestamps compare correctly as strings. Epoch seconds are accepted too."""
+    if value is None or value == "":
+        return default
+    try:
+        if isinstance(value, (int, float)):
+            dt = datetime.fromtimestamp(value, timezone.utc)
+        else:
+            dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except (ValueError, OverflowError, OSError):
+        return default
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+def parse_line(line: str, device: str | None, received: str) -> tuple[str, str, str | None] | None:
+    """Raw log line -> (log_text, timestamp, device_name). A leading timestamp
+    is used when present, otherwise the time the batch was received."""
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            return parse_record(json.loads(line), device, received)
+        except ValueError:
+            pass
+    ts = received
+    m = _LEADING_TS_RE.match(line)
+    if m:
+        stamp, sep, offset = m.groups()
+        if sep == "T" and offset in (None, "Z") and len(stamp) in (19, 26):
+            ts = stamp  # already naive/UTC ISO: skip the datetime round trip
+        else:
+            ts = normalize_timestamp(stamp + (offset or ""), received)
+    if device is None:
+        d = _DEVICE_RE.search(line)
+        device = d.group(1) if d else None
+    return line, ts, device
+
+
+def parse_record(rec: Any, device: str | None, received: str) -> tuple[str, str, str | None] | None:
+    """JSON log record ({"text"|"message"|"log_text", "timestamp"|"ts", "device"|"device_name"}) or a bare string."""
+    if isinstance(rec, str):
+        return parse_line(rec, device, received)
+    if not isinstance(rec, dict):
+        return None
+    text = rec.get("text") or rec.get("message") or rec.get("log_text")
+    if not text:
+        return None
+    ts = normalize_timestamp(rec.get("timestamp", rec.get("ts")), received)
+    return str(text), ts, rec.get("device") or rec.get("device_name") or device
+
+
+def iter_log_rows(items: Iterable[Any], device: str | None = None) -> Iterator[tuple[str, str, str | None]]:
+    """Rows for DBManager.insert_logs_bulk from raw lines (str/bytes) or JSON records."""
+    received = utc_now()
+    for item in items:
+        if isinstance(item, bytes):
+            item = item.decode("utf-8", errors="ignore")
+        row = parse_line(item, device, received) if isinstance(item, str) else parse_record(item, device, received)
+        if row is not None:
+            yield row
@@ -1,30 +1,155 @@
 from __future__ import annotations
 
+import re
+import threading
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import sql as pgsql
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 
 class PostgresKB:
     """Minimal Postgres KB adapter.
 
     Expected table schema (same columns as SQLite knowledge_base):
       id (serial/int), category, question, answer, keywords
+
+    Connections come from a ThreadedConnectionPool (created on first use) and
+    are health-checked on checkout. Checkouts beyond `maxconn` wait on a
+    semaphore instead of failing with PoolError. After `ensure_fulltext()` the table also
+    carries a generated `search_tsv` column with a GIN index, which
+    `search_fulltext` ranks with ts_rank.
     """
 
-    def __init__(self, host: str, port: int, dbname: str, user: str, password: str, table: str = "knowledge_base"):
+    def __init__(self, host: str, port: int, dbname: str, user: str, password: str, table: str = "knowledge_base",
+                 minconn: int = 1, maxconn: int = 10):
         self.host = host
         self.port = port
         self.dbname = dbname
         self.user = user
         self.password = password
         self.table = table
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._pool: ThreadedConnectionPool | None = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._has_fulltext: bool | None = None
+        self._stats_lock = threading.Lock()
+        self.stats = {"checkouts": 0, "discarded": 0}
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(
+                        self.minconn, self.maxconn,
+                        host=self.host, port=self.port, dbname=self.dbname, user=self.user, password=self.password,
+                    )
+        return self._pool
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
 
+    def _checkout(self, pool: ThreadedConnectionPool):
+        # replace connections the server dropped while they sat in the pool;
+        # maxconn + 1 tries covers every pooled conn plus a freshly opened one
+        for _ in range(self.maxconn + 1):
+            conn = pool.getconn()
+            if self._healthy(conn):
+                return conn
+            self._count("discarded")
+            pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("no healthy Postgres connection after %d tries" % (self.maxconn + 1))
+
+    @contextmanager
     def _conn(self):
-        return psycopg2.connect(
-            host=self.host, port=self.port, dbname=self.dbname, user=self.user, password=self.password
-        )
+        pool = self._get_pool()
+        with self._slots:
+            conn = self._checkout(pool)
+            self._count("checkouts")
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+    def ensure_fulltext(self) -> None:
+        """Upgrade the table in place: add the generated tsvector column and its
+        GIN index if missing (Postgres 12+). Safe to run repeatedly."""
+        # PG_TABLE may be schema-qualified ("public.kb"); the index name uses the bare table name
+        parts = self.table.split(".")
+        sql = pgsql.SQL("""
+        ALTER TABLE {table}
+          ADD COLUMN IF NOT EXISTS search_tsv tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(question, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(keywords, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(category, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(answer, '')), 'C')
+          ) STORED;
+        CREATE INDEX IF NOT EXISTS {index} ON {table} USING GIN (search_tsv);
+        """).format(table=pgsql.Identifier(*parts), index=pgsql.Identifier(f"{parts[-1]}_search_tsv_idx"))
+        with self._conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+        self._has_fulltext = True
+
+    def has_fulltext(self) -> bool:
+        if self._has_fulltext is None:
+            schema, _, name = self.table.rpartition(".")
+            sql = """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = %s AND column_name = 'search_tsv'
+              AND (%s = '' OR table_schema = %s)
+            """
+            with self._conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (name, schema, schema))
+                    self._has_fulltext = cur.fetchone() is not None
+        return self._has_fulltext
+
+    def search_fulltext(self, q: str, limit: int = 5) -> list[dict]:
+        """GIN-indexed full-text search ordered by ts_rank; each row carries `rank`."""
+        terms = re.findall(r"\w+", (q or "").lower())
+        if not terms:
+            return []
+        # OR the terms so partial matches still rank; \w+ tokens are safe in to_tsquery
+        tsq = " | ".join(terms)
+        sql = f"""
+        SELECT id, category, question, answer, keywords, ts_rank(search_tsv, query) AS rank
+        FROM {self.table}, to_tsquery('english', %s) query
+        WHERE search_tsv @@ query
+        ORDER BY rank DESC
+        LIMIT %s
+        """
+        with self._conn() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql, (tsq, limit))
+                return cur.fetchall()
 
     def search_like(self, q: str, limit: int = 5) -> list[dict]:
-        # Simple LIKE search (fallback). You can improve with full-text search later.
+        # Simple LIKE search (fallback when the table has not been migrated).
         q_like = f"%{q}%"
         sql = f"""
         SELECT id, category, question, answer, keywords
@@ -44,4 +169,3 @@ class PostgresKB:
         with self._conn() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql, (category, question, answer, keywords))
-                conn.commit()
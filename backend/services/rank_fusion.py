@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+
+def context_key(ctx: dict[str, Any]) -> tuple:
+    """Identity used to merge the same item coming from different retrievers:
+    KB rows by id (lexical rows and vector chunks of that row fuse), everything
+    else by source + text."""
+    meta = ctx.get("metadata") or {}
+    if meta.get("kb_id") is not None:
+        return ("kb", int(meta["kb_id"]))
+    text = ctx.get("text") or ""
+    return ("text", meta.get("path") or meta.get("source"), hashlib.sha1(text.encode("utf-8", errors="ignore")).hexdigest())
+
+
+def reciprocal_rank_fusion(ranked: dict[str, list[dict[str, Any]]], k: int = 60) -> list[dict[str, Any]]:
+    """Merge ranked context lists with RRF: score(d) = sum over lists of 1 / (k + rank).
+
+    Each fused context keeps the first-seen text/metadata and records, per
+    source list, its rank and that list's own score under `sources`.
+    """
+    fused: dict[tuple, dict[str, Any]] = {}
+    for name, items in ranked.items():
+        for rank, ctx in enumerate(items, start=1):
+            key = context_key(ctx)
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {
+                    "text": ctx.get("text"),
+                    "metadata": ctx.get("metadata") or {},
+                    "rrf": 0.0,
+                    "sources": {},
+                }
+            entry["rrf"] += 1.0 / (k + rank)
+            entry["sources"][name] = {"rank": rank, "score": ctx.get("score")}
+            if name == "lexical" and ctx.get("answer") is not None:
+                entry["answer"] = ctx["answer"]
+    out = sorted(fused.values(), key=lambda e: e["rrf"], reverse=True)
+    for e in out:
+        e["rrf"] = round(e["rrf"], 6)
+    return out
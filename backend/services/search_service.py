@@ -1,30 +1,64 @@
 from __future__ import annotations
 
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Optional
 
 from config import (
     SEARCH_BACKEND,
     SQLITE_DB_PATH,
+    SQLITE_WAL,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_KB,
+    SQLITE_KB_SNAPSHOT,
+    SQLITE_POOL_SIZE,
     CHROMA_DIR,
     COLLECTION_NAME,
     TOP_K,
+    EMBED_WARMUP,
+    EMBED_WORKERS,
+    EMBED_BATCH_SIZE,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL,
     CLAUDE_BIN,
     CLAUDE_SYNTH,
+    SYNTH_MAX_CONCURRENCY,
+    SYNTH_TIMEOUT,
+    SYNTH_MAX_QUEUE,
+    SYNTH_PRESPAWN,
     PG_HOST, PG_PORT, PG_DB, PG_USER, PG_PASSWORD, PG_TABLE,
+    PG_POOL_MIN, PG_POOL_MAX, PG_FULLTEXT,
 )
 
 # Legacy
 from db_manager import DBManager
+from services.rank_fusion import reciprocal_rank_fusion
 
-# Vector
-from vector.query import VectorRetriever
-from vector.rag import synthesize
-from vector.ingest_sqlite import ingest_sqlite_kb
-from vector.ingest_files import ingest_dir
+# Optional backends are plugins: their modules (and heavy deps such as
+# chromadb, sentence-transformers, psycopg2) are imported only when the mode
+# is selected or a feature first needs them, e.g. /vector/index/* in sqlite mode.
+_BACKEND_MODULES = {
+    "vector": ("vector.query", "vector.rag", "vector.synth_pool", "vector.ingest_sqlite", "vector.ingest_files"),
+    "postgres": ("services.postgres_manager",),
+}
+_import_seconds: dict[str, float] = {}
+_import_lock = threading.Lock()
 
-# Postgres
-from services.postgres_manager import PostgresKB
+def load_backend(name: str) -> None:
+    """Import a backend's modules once, recording how long the import took."""
+    if name in _import_seconds:
+        return
+    with _import_lock:
+        if name in _import_seconds:
+            return
+        t0 = time.perf_counter()
+        for mod in _BACKEND_MODULES[name]:
+            importlib.import_module(mod)
+        _import_seconds[name] = time.perf_counter() - t0
+        print(f"[STARTUP] loaded {name} backend in {_import_seconds[name]:.2f}s")
 
 
 @dataclass
@@ -37,52 +71,239 @@ class SearchResult:
 
 
 class SearchService:
-    def __init__(self):
+    def __init__(self, sqlite_mgr: DBManager | None = None):
+        t0 = time.perf_counter()
         self.mode = SEARCH_BACKEND
 
-        # Legacy sqlite
-        self.sqlite_mgr = DBManager(str(SQLITE_DB_PATH))
+        # Legacy sqlite (pass the app's manager so both share connections and KB caches)
+        self.sqlite_mgr = sqlite_mgr or DBManager(
+            str(SQLITE_DB_PATH),
+            wal=SQLITE_WAL,
+            mmap_size=SQLITE_MMAP_SIZE,
+            cache_kb=SQLITE_CACHE_KB,
+            kb_snapshot=SQLITE_KB_SNAPSHOT,
+            pool_size=SQLITE_POOL_SIZE,
+        )
 
-        # Vector
-        self.vector_retriever = VectorRetriever(str(CHROMA_DIR), COLLECTION_NAME)
-
-        # Postgres (init lazily to avoid requiring Postgres running in other modes)
+        # Vector / Postgres clients are created on first use
+        self._vector_retriever = None
         self._pg = None
+        # hybrid mode runs its lexical and vector branches side by side
+        # (the executor starts no threads until the first submit)
+        self._branch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid")
+        self._synth = None
+        self._synth_lock = threading.Lock()
+
+        # the selected backend loads now so the first request doesn't pay for it
+        if self.mode in _BACKEND_MODULES:
+            load_backend(self.mode)
+        if self.mode == "hybrid":
+            load_backend("vector")
+        if self.mode in ("vector", "hybrid") and EMBED_WARMUP:
+            from vector.embedder import warmup as warmup_embedder
+
+            threading.Thread(target=warmup_embedder, name="embedder-warmup", daemon=True).start()
+        self.init_seconds = time.perf_counter() - t0
+
+    @property
+    def vector_retriever(self):
+        if self._vector_retriever is None:
+            load_backend("vector")
+            from vector.query import QUERY_EMBED_CACHE, VectorRetriever
+
+            QUERY_EMBED_CACHE.configure(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL or None)
+            self._vector_retriever = VectorRetriever(str(CHROMA_DIR), COLLECTION_NAME)
+        return self._vector_retriever
+
+    def query_cache_stats(self) -> dict | None:
+        if self._vector_retriever is None:
+            return None
+        return self._vector_retriever.cache.stats()
+
+    def _synth_executor(self):
+        with self._synth_lock:
+            if self._synth is None:
+                from vector.synth_pool import SynthesisExecutor
+
+                self._synth = SynthesisExecutor(
+                    claude_bin=CLAUDE_BIN,
+                    max_concurrency=SYNTH_MAX_CONCURRENCY,
+                    timeout=SYNTH_TIMEOUT,
+                    max_queue=SYNTH_MAX_QUEUE,
+                    prespawn=SYNTH_PRESPAWN,
+                )
+            return self._synth
+
+    def synth_stats(self) -> dict | None:
+        return self._synth.stats() if self._synth is not None else None
 
-    def _pg_client(self) -> PostgresKB:
+    def startup_report(self) -> dict:
+        return {
+            "mode": self.mode,
+            "service_init_seconds": round(self.init_seconds, 4),
+            "backends": {
+                name: {
+                    "loaded": name in _import_seconds,
+                    "import_seconds": round(_import_seconds[name], 4) if name in _import_seconds else None,
+                }
+                for name in _BACKEND_MODULES
+            },
+        }
+
+    def _pg_client(self):
         if self._pg is None:
+            load_backend("postgres")
+            from services.postgres_manager import PostgresKB
+
             self._pg = PostgresKB(
-                host=PG_HOST, port=PG_PORT, dbname=PG_DB, user=PG_USER, password=PG_PASSWORD, table=PG_TABLE
+                host=PG_HOST, port=PG_PORT, dbname=PG_DB, user=PG_USER, password=PG_PASSWORD, table=PG_TABLE,
+                minconn=PG_POOL_MIN, maxconn=PG_POOL_MAX,
             )
         return self._pg
 
-    def index_vector_from_sqlite(self) -> dict:
-        return ingest_sqlite_kb(str(SQLITE_DB_PATH), str(CHROMA_DIR), COLLECTION_NAME)
+    def index_vector_from_sqlite(self, progress=None) -> dict:
+        load_backend("vector")
+        from vector.ingest_sqlite import ingest_sqlite_kb
+
+        return ingest_sqlite_kb(str(SQLITE_DB_PATH), str(CHROMA_DIR), COLLECTION_NAME,
+                                batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS, progress=progress)
+
+    def index_vector_from_dir(self, dir_path: str, progress=None) -> dict:
+        load_backend("vector")
+        from vector.ingest_files import ingest_dir
+
+        return ingest_dir(dir_path, str(CHROMA_DIR), COLLECTION_NAME,
+                          batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS, progress=progress)
+
+    def index_vector_files(self, paths: list[str], progress=None) -> dict:
+        load_backend("vector")
+        from vector.ingest_files import ingest_paths
+
+        return ingest_paths(paths, str(CHROMA_DIR), COLLECTION_NAME,
+                            batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS, progress=progress)
+
+    def _lexical_contexts(self, q: str, top_k: int) -> list[dict[str, Any]]:
+        """Ranked KB rows from FTS5/BM25, falling back to the fuzzy best match."""
+        hits = self.sqlite_mgr.fts_search_kb(q, limit=top_k)
+        if not hits:
+            row, score = self.sqlite_mgr.fuzzy_search_kb(q)
+            hits = [(row, score)] if row else []
+        return [{"text": f"Category: {r['category']}\nQ: {r['question']}\nA: {r['answer']}",
+                 "metadata": {"source": "sqlite_kb", "kb_id": r["id"], "category": r["category"]},
+                 "answer": r["answer"],
+                 "score": float(c)}
+                for r, c in hits]
+
+    def _hybrid_contexts(self, q: str, where: dict | None, top_k: int) -> list[dict[str, Any]]:
+        # both branches in flight at once: latency ~ max(lexical, vector), not the sum
+        lex_f = self._branch_pool.submit(self._lexical_contexts, q, top_k)
+        vec_f = self._branch_pool.submit(self.vector_retriever.retrieve, q, top_k, where)
+        lexical = lex_f.result()
+        vector = vec_f.result()
+        for c in vector:
+            # chroma returns squared L2 on normalized vectors: cos = 1 - d/2
+            if c.get("distance") is not None:
+                c["score"] = max(0.0, 1.0 - float(c["distance"]) / 2.0)
+        return reciprocal_rank_fusion({"lexical": lexical, "vector": vector})[:top_k]
 
-    def index_vector_from_dir(self, dir_path: str) -> dict:
-        return ingest_dir(dir_path, str(CHROMA_DIR), COLLECTION_NAME)
+    def _search_hybrid(self, query: str, q: str, where: dict | None, top_k: int) -> SearchResult:
+        fused = self._hybrid_contexts(q, where, top_k)
+        if not fused:
+            return SearchResult(answer=None, source="hybrid", confidence=0.0, contexts=[])
+
+        top = fused[0]
+        confidence = self.contexts_confidence(fused)
+        if CLAUDE_SYNTH:
+            from vector.rag import synthesize
+
+            ans = synthesize(query, fused, claude_bin=CLAUDE_BIN, executor=self._synth_executor())
+            if ans:
+                return SearchResult(answer=ans, source="hybrid+claude", confidence=max(confidence, 0.75), contexts=fused)
+            # synthesis timed out / overloaded: answer from the top fused context
+        return SearchResult(answer=top.get("answer") or top.get("text"), source="hybrid",
+                            confidence=float(confidence), contexts=fused)
+
+    # ---------- streaming (/ask/stream) ----------
+
+    def streams_synthesis(self) -> bool:
+        return CLAUDE_SYNTH and self.mode in ("vector", "hybrid")
+
+    def retrieve_contexts(self, query: str, where: dict | None = None, top_k: int = TOP_K) -> list[dict[str, Any]]:
+        """Retrieval only (no synthesis) for the vector/hybrid modes."""
+        q = (query or "").strip().lower()
+        if not q:
+            return []
+        if self.mode == "hybrid":
+            return self._hybrid_contexts(q, where, top_k)
+        return self.vector_retriever.retrieve(q, k=top_k, where=where)
+
+    def contexts_confidence(self, contexts: list[dict[str, Any]]) -> float:
+        """Confidence search_kb reports when it answers straight from the top
+        retrieved context (synthesis off, timed out or shed)."""
+        if self.mode == "hybrid":
+            return float(max((s["score"] or 0.0) for s in contexts[0]["sources"].values()))
+        return 0.6
+
+    def synthesize_stream(self, query: str, contexts: list[dict[str, Any]]):
+        """Yield ("token", text) pieces as the CLI produces them, or a single
+        ("fallback", top context) if synthesis is unavailable or times out
+        before producing anything."""
+        from vector.rag import build_prompt
+
+        produced = False
+        for piece in self._synth_executor().stream(build_prompt(query, contexts)):
+            produced = True
+            yield "token", piece
+        if not produced:
+            top = contexts[0]
+            yield "fallback", top.get("answer") or top.get("text") or ""
 
     def search_kb(self, query: str, where: dict | None = None, top_k: int = TOP_K) -> SearchResult:
         q = (query or "").strip().lower()
         if not q:
             return SearchResult(answer=None, source=self.mode, confidence=0.0)
 
+        if self.mode == "hybrid":
+            return self._search_hybrid(query, q, where, top_k)
+
         if self.mode == "vector":
             contexts = self.vector_retriever.retrieve(q, k=top_k, where=where)
             if not contexts:
                 return SearchResult(answer=None, source="vector", confidence=0.0, contexts=[])
 
             if CLAUDE_SYNTH:
-                ans = synthesize(query, contexts, claude_bin=CLAUDE_BIN)
-                # We keep confidence rough since CLI doesn't return scores reliably.
-                return SearchResult(answer=ans, source="vector+claude", confidence=0.75, contexts=contexts)
+                from vector.rag import synthesize
+
+                ans = synthesize(query, contexts, claude_bin=CLAUDE_BIN, executor=self._synth_executor())
+                if ans:
+                    # We keep confidence rough since CLI doesn't return scores reliably.
+                    return SearchResult(answer=ans, source="vector+claude", confidence=0.75, contexts=contexts)
+                # synthesis timed out / overloaded: fall through to the top chunk
 
             # No Claude synthesis: return top chunk
             top = contexts[0]
             return SearchResult(answer=top.get("text"), source="vector", confidence=0.6, contexts=contexts)
 
         if self.mode == "postgres":
-            hits = self._pg_client().search_like(q, limit=top_k)
+            pg = self._pg_client()
+            if PG_FULLTEXT == "true" or (PG_FULLTEXT == "auto" and pg.has_fulltext()):
+                hits = pg.search_fulltext(q, limit=top_k)
+                if not hits:
+                    return SearchResult(answer=None, source="postgres_fts", confidence=0.0, contexts=[])
+                best = hits[0]
+                # ts_rank is unbounded and small; squash it into [0, 1)
+                conf = float(best["rank"]) / (float(best["rank"]) + 0.1)
+                return SearchResult(
+                    answer=best.get("answer"),
+                    source="postgres_fts",
+                    confidence=conf,
+                    contexts=[{"text": f"Category: {h.get('category')}\nQ: {h.get('question')}\nA: {h.get('answer')}",
+                               "metadata": {"source": "postgres_fts", "kb_id": h.get("id"), "category": h.get("category")},
+                               "score": float(h["rank"])}
+                              for h in hits]
+                )
+
+            hits = pg.search_like(q, limit=top_k)
             if not hits:
                 return SearchResult(answer=None, source="postgres", confidence=0.0)
             # Take the first hit as best
@@ -95,6 +316,21 @@ class SearchService:
                            "metadata": {"source": "postgres", "kb_id": best.get("id"), "category": best.get("category")}}]
             )
 
+        if self.mode == "sqlite_fts":
+            hits = self.sqlite_mgr.fts_search_kb(q, limit=top_k)
+            if not hits:
+                return SearchResult(answer=None, source="sqlite_fts", confidence=0.0, contexts=[])
+            best, conf = hits[0]
+            return SearchResult(
+                answer=best["answer"],
+                source="sqlite_fts",
+                confidence=float(conf),
+                contexts=[{"text": f"Category: {r['category']}\nQ: {r['question']}\nA: {r['answer']}",
+                           "metadata": {"source": "sqlite_fts", "kb_id": r["id"], "category": r["category"]},
+                           "score": float(c)}
+                          for r, c in hits]
+            )
+
         # default: sqlite legacy fuzzy
         row, score = self.sqlite_mgr.fuzzy_search_kb(q)
         if row:
@@ -103,6 +339,6 @@ class SearchService:
                 source="sqlite",
                 confidence=float(score),
                 contexts=[{"text": f"Category: {row['category']}\nQ: {row['question']}\nA: {row['answer']}",
-                           "metadata": {"source": "sqlite", "kb_id": row.get("id"), "category": row["category"]}}]
+                           "metadata": {"source": "sqlite", "kb_id": row["id"], "category": row["category"]}}]
             )
         return SearchResult(answer=None, source="sqlite", confidence=float(score or 0.0))
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Iterable, Iterator
+
+from services.log_ingest import normalize_timestamp, utc_now
+
+
+def _number(value: Any) -> float | None:
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    return v if 0.0 <= v <= 100.0 else None
+
+
+def parse_sample(rec: Any, device: str | None, received: str, high: float = 80.0):
+    """{"device", "cpu"|"cpu_usage", "ram"|"ram_usage", "status"?, "timestamp"?}
+    -> (device_name, cpu, ram, status, timestamp), or None if unusable.
+    Without a status, one is derived from the same threshold /deep-research uses."""
+    if not isinstance(rec, dict):
+        return None
+    name = rec.get("device") or rec.get("device_name") or device
+    cpu = _number(rec.get("cpu", rec.get("cpu_usage")))
+    ram = _number(rec.get("ram", rec.get("ram_usage")))
+    if not name or cpu is None or ram is None:
+        return None
+    status = rec.get("status") or ("degraded" if cpu > high or ram > high else "ok")
+    ts = normalize_timestamp(rec.get("timestamp", rec.get("ts")), received)
+    return str(name), cpu, ram, status, ts
+
+
+def iter_health_samples(items: Iterable[Any], device: str | None = None,
+                        high: float = 80.0) -> Iterator[tuple]:
+    """Samples for DBManager.insert_health_bulk from JSON records or NDJSON lines."""
+    received = utc_now()
+    for item in items:
+        if isinstance(item, bytes):
+            item = item.decode("utf-8", errors="ignore")
+        if isinstance(item, str):
+            item = item.strip()
+            if not item:
+                continue
+            try:
+                item = json.loads(item)
+            except ValueError:
+                continue
+        sample = parse_sample(item, device, received, high)
+        if sample is not None:
+            yield sample
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from vector.reader import MAX_LINE_BYTES, iter_lines
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class UploadIndex:
+    """Persistent line-level inverted index over the uploads directory.
+
+    Postings map token -> {file_id: [line_no, ...]}. For every file we keep its
+    mtime/size, the byte offset of each line (so hits can be read back with a
+    single seek) and the set of tokens it contributed, so a changed or removed
+    file can be dropped without touching the rest of the index.
+
+    On disk, `index_path` only lists the files (id, mtime, size, hash); each
+    file's offsets and postings live in `<index_path>.d/<id>.json`, so
+    indexing one upload writes that file's shard and the small listing rather
+    than the whole index. search() looks for changed files at most every
+    `refresh_interval` seconds.
+    """
+
+    _META = ("id", "mtime", "size", "sha256")
+
+    def __init__(self, uploads_dir: str, index_path: str, max_results: int = 50, refresh_interval: float = 1.0):
+        self.uploads_dir = uploads_dir
+        self.index_path = index_path
+        self.shard_dir = index_path + ".d"
+        self.max_results = max_results
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self.files: dict[str, dict] = {}
+        self.postings: dict[str, dict[str, list[int]]] = {}
+        self._next_id = 0
+        self._last_refresh = float("-inf")
+        # sorted vocabulary (and its reversed words) for prefix/suffix lookups; rebuilt after changes
+        self._vocab: list[str] | None = None
+        self._rvocab: list[str] = []
+        self._load()
+
+    # ---------- persistence ----------
+
+    def _shard_path(self, fid: str) -> str:
+        return os.path.join(self.shard_dir, f"{fid}.json")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if "postings" in data:
+            return  # single-file index from an older version: refresh() rebuilds it
+        self._next_id = int(data.get("next_id", 0))
+        for path, meta in data.get("files", {}).items():
+            try:
+                with open(self._shard_path(meta["id"]), "r") as f:
+                    shard = json.load(f)
+            except Exception:
+                continue  # missing shard: refresh() re-indexes the file
+            self._add(path, meta, shard["offsets"], shard["postings"])
+
+    def save(self) -> None:
+        """Write the file listing (shards are written as files are indexed)."""
+        with self._lock:
+            files = {path: {k: info[k] for k in self._META} for path, info in self.files.items()}
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"files": files, "next_id": self._next_id}, f)
+            os.replace(tmp, self.index_path)
+
+    # ---------- maintenance ----------
+
+    def _add(self, path: str, meta: dict, offsets: list[int], postings: dict[str, list[int]]) -> None:
+        fid = meta["id"]
+        for tok, lines in postings.items():
+            self.postings.setdefault(tok, {})[fid] = lines
+        self.files[path] = dict(meta, offsets=offsets, tokens=sorted(postings))
+        self._vocab = None
+
+    def _remove(self, path: str) -> None:
+        info = self.files.pop(path, None)
+        if not info:
+            return
+        fid = info["id"]
+        for tok in info["tokens"]:
+            plist = self.postings.get(tok)
+            if plist is None:
+                continue
+            plist.pop(fid, None)
+            if not plist:
+                del self.postings[tok]
+        self._vocab = None
+        try:
+            os.remove(self._shard_path(fid))
+        except OSError:
+            pass
+
+    def index_file(self, path: str, save: bool = True, sha256: str | None = None) -> None:
+        """(Re)index one file. Called by /upload (which passes the content hash
+        it computed while streaming) and by refresh() on mtime change."""
+        with self._lock:
+            self._remove(path)
+            if not os.path.isfile(path):
+                if save:
+                    self.save()
+                return
+            st = os.stat(path)
+            fid = str(self._next_id)
+            self._next_id += 1
+            offsets: list[int] = []
+            postings: dict[str, list[int]] = {}
+            for line_no, (start, _, line) in enumerate(iter_lines(path)):
+                offsets.append(start)
+                for tok in set(tokenize(line)):
+                    postings.setdefault(tok, []).append(line_no)
+            meta = {"id": fid, "mtime": st.st_mtime, "size": st.st_size, "sha256": sha256}
+            os.makedirs(self.shard_dir, exist_ok=True)
+            tmp = self._shard_path(fid) + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"offsets": offsets, "postings": postings}, f)
+            os.replace(tmp, self._shard_path(fid))
+            self._add(path, meta, offsets, postings)
+            if save:
+                self.save()
+
+    def refresh(self) -> None:
+        """Pick up added/changed/removed files by comparing mtime and size."""
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            seen = set()
+            changed = False
+            if os.path.isdir(self.uploads_dir):
+                for name in os.listdir(self.uploads_dir):
+                    if name.startswith("."):
+                        continue  # in-progress uploads (.upload-*.part)
+                    path = os.path.join(self.uploads_dir, name)
+                    if not os.path.isfile(path):
+                        continue
+                    seen.add(path)
+                    st = os.stat(path)
+                    info = self.files.get(path)
+                    if info and info["mtime"] == st.st_mtime and info["size"] == st.st_size:
+                        continue
+                    self.index_file(path, save=False)
+                    changed = True
+            for path in [p for p in self.files if p not in seen]:
+                self._remove(path)
+                changed = True
+            if changed:
+                self.save()
+
+    def find_by_hash(self, sha256: str) -> str | None:
+        """Path of an already-indexed, unchanged upload with this content hash."""
+        with self._lock:
+            for path, info in self.files.items():
+                if info.get("sha256") != sha256:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if st.st_mtime == info["mtime"] and st.st_size == info["size"]:
+                    return path
+        return None
+
+    # ---------- query ----------
+
+    def _maybe_refresh(self) -> None:
+        with self._lock:
+            if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                self.refresh()
+
+    @staticmethod
+    def _with_prefix(words: list[str], prefix: str):
+        i = bisect_left(words, prefix)
+        while i < len(words) and words[i].startswith(prefix):
+            yield words[i]
+            i += 1
+
+    def _vocab_match(self, tok: str, mode: str) -> set[str]:
+        # Query boundary tokens may be word fragments ("vpn not conn"), so they
+        # are expanded against the vocabulary instead of looked up exactly.
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+            self._rvocab = sorted(t[::-1] for t in self.postings)
+        if mode == "prefix":
+            return set(self._with_prefix(self._vocab, tok))
+        if mode == "suffix":
+            return {r[::-1] for r in self._with_prefix(self._rvocab, tok[::-1])}
+        return {t for t in self._vocab if tok in t}
+
+    def _lines_for(self, toks: set[str]) -> dict[str, set[int]]:
+        out: dict[str, set[int]] = {}
+        for t in toks:
+            for fid, lines in self.postings.get(t, {}).items():
+                out.setdefault(fid, set()).update(lines)
+        return out
+
+    def _candidates(self, query_tokens: list[str]) -> dict[str, set[int]]:
+        n = len(query_tokens)
+        groups: list[set[str]] = []
+        for i, tok in enumerate(query_tokens):
+            if n == 1:
+                groups.append(self._vocab_match(tok, "contains"))
+            elif i == 0:
+                groups.append(self._vocab_match(tok, "suffix"))
+            elif i == n - 1:
+                groups.append(self._vocab_match(tok, "prefix"))
+            else:
+                groups.append({tok} if tok in self.postings else set())
+        # intersect smallest posting groups first
+        cand: dict[str, set[int]] | None = None
+        for g in sorted(groups, key=len):
+            lines = self._lines_for(g)
+            if cand is None:
+                cand = lines
+            else:
+                cand = {fid: cand[fid] & ls for fid, ls in lines.items() if fid in cand and cand[fid] & ls}
+            if not cand:
+                return {}
+        return cand or {}
+
+    def search(self, query: str, limit: int | None = None) -> list[str]:
+        """Lines containing `query` (case-insensitive substring), capped at `limit`."""
+        query = (query or "").lower()
+        limit = self.max_results if limit is None else limit
+        q_tokens = tokenize(query)
+        with self._lock:
+            self._maybe_refresh()
+            if not q_tokens:
+                paths = [path for path, _ in sorted(self.files.items(), key=lambda kv: int(kv[1]["id"]))]
+            else:
+                cand = self._candidates(q_tokens)
+                by_id = {info["id"]: (path, info) for path, info in self.files.items()}
+        if not q_tokens:
+            # nothing to look up (e.g. "->" or "::"): scan the indexed files' lines
+            return self._scan(paths, query, limit)
+
+        results: list[str] = []
+        for fid in sorted(cand, key=int):
+            path, info = by_id[fid]
+            try:
+                with open(path, "rb") as f:
+                    for line_no in sorted(cand[fid]):
+                        f.seek(info["offsets"][line_no])
+                        line = f.readline(MAX_LINE_BYTES).decode("utf-8", errors="ignore")
+                        # postings only narrow the candidates; confirm the substring
+                        if query in line.lower():
+                            results.append(line.strip())
+                            if len(results) >= limit:
+                                return results
+            except OSError:
+                continue
+        return results
+
+    @staticmethod
+    def _scan(paths: list[str], query: str, limit: int) -> list[str]:
+        results: list[str] = []
+        for path in paths:
+            try:
+                for _, _, line in iter_lines(path):
+                    if query in line.lower():
+                        results.append(line.strip())
+                        if len(results) >= limit:
+                            return results
+            except OSError:
+                continue
+        return results
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Iterator
+
 import chromadb
 
 class ChromaStore:
@@ -7,8 +9,31 @@ class ChromaStore:
         self.client = chromadb.PersistentClient(path=persist_dir)
         self.col = self.client.get_or_create_collection(name=collection_name)
 
-    def upsert(self, ids: list[str], documents: list[str], embeddings: list[list[float]], metadatas: list[dict]):
+    def upsert(self, ids: list[str], documents: list[str] | None, embeddings: list[list[float]], metadatas: list[dict]):
+        # documents=None: embeddings + metadata only (text is resolved from the source)
         self.col.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
 
     def query_by_embedding(self, query_embedding: list[float], n_results: int = 5, where: dict | None = None):
         return self.col.query(query_embeddings=[query_embedding], n_results=n_results, where=where)
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        # re-point existing chunks (e.g. moved byte spans) without re-embedding
+        if ids:
+            self.col.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids: list[str]):
+        if ids:
+            self.col.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.col.count()
+
+    def ids(self, where: dict | None = None, page_size: int = 1000) -> Iterator[str]:
+        # paged so a large collection is not fetched in one response
+        offset = 0
+        while True:
+            page = self.col.get(where=where, include=[], limit=page_size, offset=offset)["ids"]
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import BinaryIO, Iterator
+
 def chunk_text(text: str, max_chars: int = 1400, overlap: int = 200) -> list[str]:
     """Simple char-based chunking with overlap (good enough for KB + logs)."""
     text = (text or "").strip()
@@ -14,3 +16,80 @@ def chunk_text(text: str, max_chars: int = 1400, overlap: int = 200) -> list[str
             chunks.append(chunk)
         i += step
     return chunks
+
+
+_WS = b" \t\r\n"
+
+
+def _cut_point(data: bytes, start: int, end: int) -> int:
+    """Best place to end a chunk in data[start:end]: after the last newline,
+    else after the last sentence end, else after the last space, searching
+    only the second half of the window so chunks do not get tiny; otherwise
+    a hard cut that does not split a UTF-8 sequence."""
+    lo = start + (end - start) // 2
+    pos = data.rfind(b"\n", lo, end)
+    if pos != -1:
+        return pos + 1
+    for sep in (b". ", b"? ", b"! "):
+        pos = data.rfind(sep, lo, end)
+        if pos != -1:
+            return pos + 2
+    pos = data.rfind(b" ", lo, end)
+    if pos != -1:
+        return pos + 1
+    while end > start + 1 and (data[end] & 0xC0) == 0x80:
+        end -= 1
+    return end
+
+
+def _overlap_start(data: bytes, start: int, end: int, overlap: int) -> int:
+    """Start of the next chunk: the first line (else sentence, else word)
+    boundary in the last `overlap` bytes of the previous one, so overlaps hold
+    whole records."""
+    lo = max(start + 1, end - overlap)
+    for sep in (b"\n", b". ", b"? ", b"! ", b" "):
+        pos = data.find(sep, lo, end)
+        if pos != -1 and pos + len(sep) < end:
+            return pos + len(sep)
+    return end
+
+
+def iter_stream_spans(f: BinaryIO, max_bytes: int = 1400, overlap: int = 200,
+                      block_size: int = 1 << 20) -> Iterator[tuple[int, int, bytes]]:
+    """Boundary-aware chunking of a binary file read front to back in
+    `block_size` pieces; yields (start, end, span bytes) with file offsets.
+    Chunks end on line breaks where possible (so a log record is not split),
+    then sentence ends, then spaces; leading and trailing whitespace is
+    excluded from every span. Only about one block is buffered, and a file
+    that shrinks while it is read simply ends early."""
+    buf = bytearray()
+    base = 0  # file offset of buf[0]
+    eof = False
+    start = 0
+    while True:
+        # the window plus one byte (the UTF-8 check in _cut_point) must be buffered
+        while not eof and len(buf) < start - base + max_bytes + 1:
+            block = f.read(block_size)
+            if block:
+                buf += block
+            else:
+                eof = True
+        n = len(buf)
+        s = start - base
+        if s >= n:
+            return
+        end = n if eof and n - s <= max_bytes else _cut_point(buf, s, s + max_bytes)
+        a, e = s, end
+        while a < e and buf[a] in _WS:
+            a += 1
+        while e > a and buf[e - 1] in _WS:
+            e -= 1
+        if e > a:
+            yield base + a, base + e, bytes(buf[a:e])
+        if end >= n:
+            return
+        start = base + _overlap_start(buf, s, end, overlap)
+        if start - base >= block_size:
+            del buf[: start - base]
+            base = start
+
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterable
+
+from .embedder import _MODEL_NAME, LocalEmbedder, get_embedder
+
+# per-worker-process embedder, created by _init_worker
+_worker_embedder: LocalEmbedder | None = None
+
+def _init_worker(model_name: str, threads: int) -> None:
+    global _worker_embedder
+    try:
+        import torch
+
+        # N workers x all cores each would oversubscribe the box
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_embedder = LocalEmbedder(model_name)
+    _worker_embedder.warmup()
+
+def _encode(texts: list[str]) -> list[list[float]]:
+    return _worker_embedder.embed(texts)
+
+
+class EmbedPool:
+    """Multi-process encoder for bulk re-indexing.
+
+    Each worker process loads the model once (in the pool initializer) and then
+    encodes whole batches. Results come back in submission order, and at most
+    `max_inflight` batches are outstanding so memory stays bounded.
+
+    Ingest code should use get_embed_pool() rather than constructing one per
+    call: spawning workers re-imports `__main__` and reloads the model in each.
+    """
+
+    def __init__(self, workers: int, model_name: str = _MODEL_NAME, max_inflight: int | None = None):
+        self.workers = workers
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        ctx = mp.get_context("spawn")  # fork after torch init is unsafe
+        self.pool = ctx.Pool(workers, initializer=_init_worker, initargs=(model_name, threads))
+        self.max_inflight = max_inflight or workers * 2
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return self.pool.apply(_encode, (texts,))
+
+    def stage(self):
+        """Pipeline embed stage: (id, doc, meta) batches -> (batch, embeddings), in order."""
+        def stage(batches: Iterable[list[tuple[str, str, dict]]]):
+            pending: deque = deque()
+            for batch in batches:
+                pending.append((batch, self.pool.apply_async(_encode, ([doc for _, doc, _ in batch],))))
+                if len(pending) >= self.max_inflight:
+                    done, res = pending.popleft()
+                    yield done, res.get()
+            while pending:
+                done, res = pending.popleft()
+                yield done, res.get()
+        return stage
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self) -> "EmbedPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if exc[0] is not None:
+            self.pool.terminate()
+        self.close()
+
+
+_shared: EmbedPool | None = None
+_shared_lock = threading.Lock()
+
+def get_embed_pool(workers: int) -> EmbedPool:
+    """Process-wide pool with `workers` processes, started on first use and
+    kept until exit (or until a different worker count is asked for)."""
+    global _shared
+    with _shared_lock:
+        if _shared is not None and _shared.workers != workers:
+            _shared.close()
+            _shared = None
+        if _shared is None:
+            _shared = EmbedPool(workers)
+        return _shared
+
+@atexit.register
+def _close_shared() -> None:
+    global _shared
+    with _shared_lock:
+        if _shared is not None:
+            _shared.pool.terminate()
+            _shared.pool.join()
+            _shared = None
+
+
+def throughput_report(texts: list[str], worker_counts: list[int], batch_size: int = 64) -> list[dict]:
+    """chunks/sec per worker count; 0 workers = the shared in-process embedder.
+    Model load time is excluded (workers are warmed before timing)."""
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    report = []
+    for n in worker_counts:
+        if n <= 0:
+            emb = get_embedder()
+            emb.warmup()
+            t0 = time.perf_counter()
+            for b in batches:
+                emb.embed(b)
+            elapsed = time.perf_counter() - t0
+        else:
+            with EmbedPool(n) as pool:
+                pool.pool.map(_encode, [["warmup"]] * n)
+                t0 = time.perf_counter()
+                items = [(str(i), t, {}) for i, t in enumerate(texts)]
+                stage = pool.stage()
+                for _ in stage(items[i:i + batch_size] for i in range(0, len(items), batch_size)):
+                    pass
+                elapsed = time.perf_counter() - t0
+        report.append({
+            "workers": n,
+            "batch_size": batch_size,
+            "chunks": len(texts),
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(len(texts) / elapsed, 1) if elapsed > 0 else None,
+        })
+        print(f"[EMBED] workers={n} {report[-1]['chunks_per_sec']} chunks/s")
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Embedding throughput per worker count")
+    ap.add_argument("--workers", default="0,1,2,4,8", help="comma-separated worker counts (0 = in-process)")
+    ap.add_argument("--chunks", type=int, default=2000)
+    ap.add_argument("--chunk-chars", type=int, default=1200)
+    ap.add_argument("--batch-size", type=int, default=64)
+    args = ap.parse_args()
+
+    line = "2024-05-01T10:00:00 LAPTOP-123 vpn client: tunnel keepalive timeout, retrying (code 720). "
+    sample = [(f"[{i}] " + line * (args.chunk_chars // len(line) + 1))[: args.chunk_chars] for i in range(args.chunks)]
+    counts = [int(x) for x in args.workers.split(",") if x.strip()]
+    print(json.dumps(throughput_report(sample, counts, batch_size=args.batch_size), indent=2))
@@ -1,14 +1,86 @@
 from __future__ import annotations
 
-from sentence_transformers import SentenceTransformer
+import threading
+import time
 
 _MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
 class LocalEmbedder:
-    """Local embeddings (no API keys required)."""
-    def __init__(self) -> None:
-        self.model = SentenceTransformer(_MODEL_NAME)
+    """Local embeddings (no API keys required).
+
+    The model is loaded on the first embed() call, not at construction. Use
+    get_embedder() rather than constructing one per request: it returns the
+    process-wide instance, so the multi-second model load happens once.
+    """
+    def __init__(self, model_name: str = _MODEL_NAME) -> None:
+        self.model_name = model_name
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+        self.load_seconds: float | None = None
+        self.encode_calls = 0
+        self.encoded_texts = 0
+        self.encode_seconds = 0.0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    t0 = time.perf_counter()
+                    self._model = SentenceTransformer(self.model_name)
+                    self.load_seconds = time.perf_counter() - t0
+        return self._model
 
     def embed(self, texts: list[str]) -> list[list[float]]:
-        vecs = self.model.encode(texts, normalize_embeddings=True)
+        model = self.model
+        # one forward pass at a time: concurrent encode() calls on a shared
+        # torch model contend for the same threads and can interleave state
+        with self._encode_lock:
+            t0 = time.perf_counter()
+            vecs = model.encode(texts, normalize_embeddings=True)
+            self.encode_seconds += time.perf_counter() - t0
+            self.encode_calls += 1
+            self.encoded_texts += len(texts)
         return vecs.tolist()
+
+    def warmup(self) -> None:
+        self.embed(["warmup"])
+
+    def stats(self) -> dict:
+        out = {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "load_seconds": self.load_seconds,
+            "encode_calls": self.encode_calls,
+            "encoded_texts": self.encoded_texts,
+            "encode_seconds": round(self.encode_seconds, 4),
+        }
+        if self._model is not None:
+            params = list(self._model.parameters())
+            out["parameters"] = sum(p.numel() for p in params)
+            out["param_bytes"] = sum(p.numel() * p.element_size() for p in params)
+        return out
+
+
+_registry: dict[str, LocalEmbedder] = {}
+_registry_lock = threading.Lock()
+
+def get_embedder(model_name: str = _MODEL_NAME) -> LocalEmbedder:
+    """Process-wide shared embedder for `model_name`."""
+    with _registry_lock:
+        emb = _registry.get(model_name)
+        if emb is None:
+            emb = _registry[model_name] = LocalEmbedder(model_name)
+        return emb
+
+def warmup(model_name: str = _MODEL_NAME) -> dict:
+    emb = get_embedder(model_name)
+    emb.warmup()
+    return emb.stats()
+
+def embedder_stats() -> dict:
+    with _registry_lock:
+        return {name: emb.stats() for name, emb in _registry.items()}
@@ -1,60 +1,195 @@
 from __future__ import annotations
 
 import os
-import uuid
-from tqdm import tqdm
 
-from .chunking import chunk_text
-from .embedder import LocalEmbedder
+from .chunking import iter_stream_spans
+from .embedder import get_embedder
 from .chroma_store import ChromaStore
+from .manifest import IndexManifest, file_hash, next_chunk_id, source_key
+from .embed_pool import get_embed_pool
+from .pipeline import Pipeline, Progress, batched, embed_stage, log_stats, upsert_stage
+from .source_store import file_chunk_document, span_hash
 
 _TEXT_EXTS = {".txt", ".md", ".log", ".json", ".yaml", ".yml", ".csv"}
 
-def _read_text(path: str) -> str:
-    try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
-    except Exception:
-        return ""
+def ingest_dir(dir_path: str, chroma_dir: str, collection_name: str, batch_size: int = 64,
+               queue_size: int = 8, workers: int = 0, progress=None) -> dict:
+    """Incrementally index `dir_path`: only new or changed files are embedded,
+    and chunks of edited/removed files are deleted from the collection.
 
-def ingest_dir(dir_path: str, chroma_dir: str, collection_name: str, batch_size: int = 64) -> dict:
+    Runs as a streaming pipeline (walk -> read -> chunk -> batch -> embed ->
+    upsert) so memory stays bounded by `queue_size` regardless of corpus size.
+    Chunks are (path, start, end) byte spans: the `File:/Path:` header plus the
+    span text is embedded, but only the embedding and offsets are stored;
+    retrieval resolves the text from the file (see source_store).
+    `progress`, if given, is called with unit/done/total/chunks keywords.
+    """
     if not os.path.isdir(dir_path):
         return {"files_seen": 0, "indexed_chunks": 0, "skipped": 0}
 
-    embedder = LocalEmbedder()
+    dir_path = os.path.abspath(dir_path)
+
+    def walk(counts, seen_paths):
+        for root, _, files in os.walk(dir_path):
+            for fn in files:
+                counts["files_seen"] += 1
+                if os.path.splitext(fn)[1].lower() not in _TEXT_EXTS:
+                    counts["skipped"] += 1
+                    continue
+                path = os.path.join(root, fn)
+                seen_paths.add(path)
+                yield path
+
+    total = None
+    if progress is not None:
+        total = sum(
+            1 for _, _, files in os.walk(dir_path) for fn in files
+            if os.path.splitext(fn)[1].lower() in _TEXT_EXTS
+        )
+    return _ingest(walk, dir_path, chroma_dir, collection_name, batch_size, queue_size, workers,
+                   progress, total, prune_prefix=dir_path + os.sep)
+
+
+def ingest_paths(paths: list[str], chroma_dir: str, collection_name: str, batch_size: int = 64,
+                 queue_size: int = 8, workers: int = 0, progress=None) -> dict:
+    """Index just these files (e.g. a fresh upload) with the same incremental,
+    offset-based pipeline as ingest_dir, without walking or pruning a directory."""
+    paths = [os.path.abspath(p) for p in paths]
+
+    def walk(counts, seen_paths):
+        for path in paths:
+            counts["files_seen"] += 1
+            if os.path.splitext(path)[1].lower() not in _TEXT_EXTS or not os.path.isfile(path):
+                counts["skipped"] += 1
+                continue
+            seen_paths.add(path)
+            yield path
+
+    return _ingest(walk, ", ".join(paths), chroma_dir, collection_name, batch_size, queue_size, workers,
+                   progress, len(paths), prune_prefix=None)
+
+
+def _ingest(walk, label: str, chroma_dir: str, collection_name: str, batch_size: int, queue_size: int,
+            workers: int, progress, total: int | None, prune_prefix: str | None) -> dict:
+    embedder = get_embedder()
     store = ChromaStore(persist_dir=chroma_dir, collection_name=collection_name)
+    manifest = IndexManifest.load(chroma_dir, collection_name)
+    if manifest.files and store.count() == 0:
+        # collection was wiped underneath the manifest: start over
+        manifest.files.clear()
 
-    ids: list[str] = []
-    docs: list[str] = []
-    metas: list[dict] = []
+    prog = Progress(progress, unit="files")
+    if total is not None:
+        prog.set_total(total)
 
-    files_seen = 0
-    skipped = 0
+    counts = {"files_seen": 0, "skipped": 0, "unchanged": 0, "changed": 0}
+    seen_paths: set[str] = set()
+    stale_ids: list[str] = []
+    moved: list[tuple[str, dict]] = []  # reused chunk ids whose byte span changed
 
-    for root, _, files in os.walk(dir_path):
-        for fn in files:
-            files_seen += 1
-            ext = os.path.splitext(fn)[1].lower()
-            if ext not in _TEXT_EXTS:
-                skipped += 1
+    def read(paths):
+        for path in paths:
+            prog.item_done()
+            try:
+                st = os.stat(path)
+            except OSError:
+                # deleted or rotated since the walk
+                counts["skipped"] += 1
                 continue
-            path = os.path.join(root, fn)
-            text = _read_text(path).strip()
-            if not text:
-                skipped += 1
+            prev = manifest.files.get(path)
+            if prev and prev["mtime"] == st.st_mtime and prev["size"] == st.st_size:
+                counts["unchanged"] += 1
                 continue
-            for idx, ch in enumerate(chunk_text(text)):
-                ids.append(f"file_{uuid.uuid4().hex[:12]}_{idx}")
-                docs.append(f"File: {fn}\nPath: {path}\n\n{ch}")
-                metas.append({"source": "file", "filename": fn, "path": path})
-
-    total = 0
-    for i in tqdm(range(0, len(docs), batch_size), desc="Embedding+Upserting"):
-        batch_docs = docs[i:i+batch_size]
-        batch_ids = ids[i:i+batch_size]
-        batch_metas = metas[i:i+batch_size]
-        batch_emb = embedder.embed(batch_docs)
-        store.upsert(batch_ids, batch_docs, batch_emb, batch_metas)
-        total += len(batch_docs)
-
-    return {"files_seen": files_seen, "indexed_chunks": total, "skipped": skipped}
+            yield path, st, prev
+
+    def chunk(docs):
+        # each file is hashed, then read once more in blocks while spans are
+        # cut, so memory does not grow with file size (no mmap: a file
+        # truncated or rotated mid-read would kill the process with SIGBUS)
+        for path, st, prev in docs:
+            try:
+                yield from chunk_file(path, st, prev)
+            except OSError:
+                counts["skipped"] += 1
+
+    def chunk_file(path, st, prev):
+        h = file_hash(path)
+        if prev and prev["hash"] == h:
+            # touched but identical content
+            prev.update(mtime=st.st_mtime, size=st.st_size)
+            counts["unchanged"] += 1
+            return
+        fn = os.path.basename(path)
+        prefix = f"file_{source_key(path)}"
+        old_ids = set(prev["chunk_ids"]) if prev else set()
+        # manifests written before spans were tracked have no "starts": treat every reused chunk as moved
+        old_starts = dict(zip(prev["chunk_ids"], prev.get("starts") or [])) if prev else {}
+        new_ids: list[str] = []
+        new_starts: list[int] = []
+        seen: dict[str, int] = {}
+        with open(path, "rb") as f:
+            for start, end, raw in iter_stream_spans(f):
+                text = raw.decode("utf-8", errors="ignore")
+                cid = next_chunk_id(prefix, text, seen)
+                new_ids.append(cid)
+                new_starts.append(start)
+                meta = {
+                    "source": "file", "filename": fn, "path": path,
+                    "start": start, "end": end, "hash": span_hash(text),
+                }
+                if cid in old_ids:
+                    # identical chunk already embedded; only its offsets may have moved
+                    if old_starts.get(cid) != start:
+                        moved.append((cid, meta))
+                    continue
+                yield cid, file_chunk_document(fn, path, text), meta
+        if not new_ids:
+            # empty / whitespace-only file
+            counts["skipped"] += 1
+            if prev:
+                stale_ids.extend(prev["chunk_ids"])
+                del manifest.files[path]
+            return
+        stale_ids.extend(old_ids - set(new_ids))
+        manifest.files[path] = {"mtime": st.st_mtime, "size": st.st_size, "hash": h,
+                                "chunk_ids": new_ids, "starts": new_starts}
+        counts["changed"] += 1
+
+    # workers > 0: encode in the shared process pool (bulk re-index on a many-core box)
+    pool = get_embed_pool(workers) if workers > 0 else None
+    pipeline = Pipeline(walk(counts, seen_paths), [
+        ("read", read),
+        ("chunk", chunk),
+        ("batch", lambda items: batched(items, batch_size)),
+        ("embed", pool.stage() if pool else embed_stage(embedder.embed)),
+        ("upsert", upsert_stage(store, on_written=prog.chunks_written, store_documents=False)),
+    ], queue_size=queue_size)
+    stages = pipeline.run()
+    log_stats(label, stages)
+
+    removed = []
+    if prune_prefix is not None:
+        removed = [p for p in manifest.files if p.startswith(prune_prefix) and p not in seen_paths]
+    for p in removed:
+        stale_ids.extend(manifest.files.pop(p)["chunk_ids"])
+
+    for i in range(0, len(moved), batch_size):
+        part = moved[i:i + batch_size]
+        store.update_metadata([cid for cid, _ in part], [meta for _, meta in part])
+    store.delete(stale_ids)
+    purged = manifest.purge_untracked(
+        store, "file", {cid for entry in manifest.files.values() for cid in entry["chunk_ids"]})
+    manifest.save()
+
+    return {
+        "files_seen": counts["files_seen"],
+        "indexed_chunks": stages["chunk"]["items"],
+        "skipped": counts["skipped"],
+        "unchanged_files": counts["unchanged"],
+        "changed_files": counts["changed"],
+        "removed_files": len(removed),
+        "deleted_chunks": len(stale_ids),
+        "purged_chunks": purged,
+        "moved_chunks": len(moved),
+        "stages": stages,
+    }
@@ -2,50 +2,109 @@ from __future__ import annotations
 
 import os
 import sqlite3
-import uuid
-from tqdm import tqdm
 
 from .chunking import chunk_text
-from .embedder import LocalEmbedder
+from .embedder import get_embedder
 from .chroma_store import ChromaStore
+from .manifest import IndexManifest, chunk_ids, content_hash, source_key
+from .embed_pool import get_embed_pool
+from .pipeline import Pipeline, Progress, batched, embed_stage, log_stats, upsert_stage
 
-def ingest_sqlite_kb(sqlite_db_path: str, chroma_dir: str, collection_name: str, batch_size: int = 64) -> dict:
+def ingest_sqlite_kb(sqlite_db_path: str, chroma_dir: str, collection_name: str, batch_size: int = 64,
+                     queue_size: int = 8, workers: int = 0, progress=None) -> dict:
+    """Incrementally index knowledge_base: only new or edited rows are embedded,
+    and chunks of edited/deleted rows are removed from the collection.
+    `progress`, if given, is called with unit/done/total/chunks keywords."""
     if not os.path.exists(sqlite_db_path):
         raise FileNotFoundError(f"SQLite DB not found: {sqlite_db_path}")
 
-    conn = sqlite3.connect(sqlite_db_path)
-    conn.row_factory = sqlite3.Row
-    try:
-        rows = conn.execute("SELECT * FROM knowledge_base").fetchall()
-    finally:
-        conn.close()
+    prog = Progress(progress, unit="rows")
+    if progress is not None:
+        conn = sqlite3.connect(sqlite_db_path)
+        try:
+            prog.set_total(conn.execute("SELECT COUNT(*) FROM knowledge_base").fetchone()[0])
+        finally:
+            conn.close()
 
-    embedder = LocalEmbedder()
+    def kb_rows():
+        # opened inside the generator: it runs on the pipeline's source thread
+        conn = sqlite3.connect(sqlite_db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield from conn.execute("SELECT * FROM knowledge_base")
+        finally:
+            conn.close()
+
+    embedder = get_embedder()
     store = ChromaStore(persist_dir=chroma_dir, collection_name=collection_name)
+    manifest = IndexManifest.load(chroma_dir, collection_name)
+    db_key = os.path.abspath(sqlite_db_path)
+    if manifest.kb.get(db_key) and store.count() == 0:
+        manifest.kb[db_key] = {}
+    known = manifest.kb.setdefault(db_key, {})
+    # row ids repeat across databases, so chunk ids also carry the db path
+    db_prefix = f"kb_{source_key(db_key)}"
+
+    stale_ids: list[str] = []
+    counts = {"unchanged": 0}
+    seen_rows: set[str] = set()
+
+    def chunk(rows):
+        for r in rows:
+            prog.item_done()
+            base = (
+                f"Category: {r['category']}\n"
+                f"Question: {r['question']}\n"
+                f"Answer: {r['answer']}\n"
+                f"Keywords: {r['keywords']}\n"
+            )
+            row_key = str(r["id"])
+            seen_rows.add(row_key)
+            h = content_hash(base)
+            prev = known.get(row_key)
+            prefix = f"{db_prefix}_{r['id']}_"
+            # rows indexed under the old `kb_<id>` ids are re-embedded once
+            if prev and prev["hash"] == h and all(cid.startswith(prefix) for cid in prev["chunk_ids"]):
+                counts["unchanged"] += 1
+                continue
+            chunks = chunk_text(base)
+            new_ids = chunk_ids(prefix[:-1], chunks)
+            old_ids = set(prev["chunk_ids"]) if prev else set()
+            for cid, ch in zip(new_ids, chunks):
+                if cid in old_ids:
+                    continue
+                yield cid, ch, {"source": "sqlite_kb", "category": r["category"], "kb_id": r["id"]}
+            stale_ids.extend(old_ids - set(new_ids))
+            known[row_key] = {"hash": h, "chunk_ids": new_ids}
+
+    # workers > 0: encode in the shared process pool (bulk re-index on a many-core box)
+    pool = get_embed_pool(workers) if workers > 0 else None
+    pipeline = Pipeline(kb_rows(), [
+        ("chunk", chunk),
+        ("batch", lambda items: batched(items, batch_size)),
+        ("embed", pool.stage() if pool else embed_stage(embedder.embed)),
+        ("upsert", upsert_stage(store, on_written=prog.chunks_written)),
+    ], queue_size=queue_size)
+    stages = pipeline.run()
+    log_stats(sqlite_db_path, stages)
+
+    removed = [k for k in known if k not in seen_rows]
+    for k in removed:
+        stale_ids.extend(known.pop(k)["chunk_ids"])
+
+    store.delete(stale_ids)
+    purged = manifest.purge_untracked(
+        store, "sqlite_kb", {cid for rows in manifest.kb.values() for entry in rows.values() for cid in entry["chunk_ids"]})
+    manifest.save()
 
-    ids: list[str] = []
-    docs: list[str] = []
-    metas: list[dict] = []
-
-    for r in rows:
-        base = (
-            f"Category: {r['category']}\n"
-            f"Question: {r['question']}\n"
-            f"Answer: {r['answer']}\n"
-            f"Keywords: {r['keywords']}\n"
-        )
-        for idx, ch in enumerate(chunk_text(base)):
-            ids.append(f"kb_{r['id']}_{idx}_{uuid.uuid4().hex[:8]}")
-            docs.append(ch)
-            metas.append({"source": "sqlite_kb", "category": r["category"], "kb_id": r["id"]})
-
-    total = 0
-    for i in tqdm(range(0, len(docs), batch_size), desc="Embedding+Upserting"):
-        batch_docs = docs[i:i+batch_size]
-        batch_ids = ids[i:i+batch_size]
-        batch_metas = metas[i:i+batch_size]
-        batch_emb = embedder.embed(batch_docs)
-        store.upsert(batch_ids, batch_docs, batch_emb, batch_metas)
-        total += len(batch_docs)
-
-    return {"kb_rows": len(rows), "indexed_chunks": total, "collection": collection_name, "chroma_dir": chroma_dir}
+    return {
+        "kb_rows": stages["source"]["items"],
+        "indexed_chunks": stages["chunk"]["items"],
+        "unchanged_rows": counts["unchanged"],
+        "removed_rows": len(removed),
+        "deleted_chunks": len(stale_ids),
+        "purged_chunks": purged,
+        "collection": collection_name,
+        "chroma_dir": chroma_dir,
+        "stages": stages,
+    }
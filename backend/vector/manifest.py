@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Iterable
+
+def content_hash(text: str | bytes) -> str:
+    if isinstance(text, str):
+        text = text.encode("utf-8", errors="ignore")
+    return hashlib.sha256(text).hexdigest()
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """content_hash of a file's bytes, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def next_chunk_id(prefix: str, chunk: str, seen: dict[str, int]) -> str:
+    """Id of the next chunk of a source; `seen` carries occurrence counts
+    between calls so ids can be assigned while streaming."""
+    h = content_hash(chunk)[:16]
+    n = seen.get(h, 0)
+    seen[h] = n + 1
+    return f"{prefix}_{h}" if n == 0 else f"{prefix}_{h}_{n}"
+
+def chunk_ids(prefix: str, chunks: Iterable[str]) -> list[str]:
+    """Deterministic ids: `<prefix>_<chunk content hash>`, with an occurrence
+    suffix when the same chunk text repeats within one source."""
+    seen: dict[str, int] = {}
+    return [next_chunk_id(prefix, ch, seen) for ch in chunks]
+
+def source_key(path: str) -> str:
+    return hashlib.sha1(path.encode("utf-8", errors="ignore")).hexdigest()[:12]
+
+
+class IndexManifest:
+    """What is already in a Chroma collection, per source.
+
+    files: abs path -> {mtime, size, hash, chunk_ids}
+    kb:    sqlite db path -> {row id -> {hash, chunk_ids}}
+    reconciled: chunk sources ("file", "sqlite_kb") whose chunks the
+                collection is known to hold only through this manifest
+
+    Stored as JSON next to the Chroma data so re-indexing can skip unchanged
+    sources and delete chunks whose source was edited or removed.
+    """
+
+    def __init__(self, path: str, data: dict | None = None):
+        self.path = path
+        data = data or {}
+        self.files: dict[str, dict] = data.get("files", {})
+        self.kb: dict[str, dict[str, dict]] = data.get("kb", {})
+        self.reconciled: list[str] = data.get("reconciled", [])
+
+    @classmethod
+    def load(cls, chroma_dir: str, collection_name: str) -> "IndexManifest":
+        path = os.path.join(chroma_dir, f"manifest_{collection_name}.json")
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    return cls(path, json.load(f))
+            except Exception:
+                pass
+        return cls(path)
+
+    def save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"files": self.files, "kb": self.kb, "reconciled": self.reconciled}, f)
+        os.replace(tmp, self.path)
+
+    def purge_untracked(self, store, source: str, tracked: set[str]) -> int:
+        """Once per source: delete its chunks that this manifest does not list.
+
+        Collections indexed before the manifest existed (random chunk ids) or
+        alongside a lost manifest would otherwise keep those chunks forever,
+        duplicating every re-indexed one. Returns how many were deleted.
+        """
+        if source in self.reconciled:
+            return 0
+        untracked = [cid for cid in store.ids(where={"source": source}) if cid not in tracked]
+        store.delete(untracked)
+        self.reconciled.append(source)
+        return len(untracked)
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator
+
+_DONE = object()
+
+Stage = tuple[str, Callable[[Iterable[Any]], Iterable[Any]]]
+
+
+class StageCounter:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.started: float | None = None
+        self.finished: float | None = None
+
+    def as_dict(self) -> dict:
+        if self.started is None:
+            return {"items": self.items, "seconds": 0.0, "per_sec": 0.0}
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return {
+            "items": self.items,
+            "seconds": round(elapsed, 3),
+            "per_sec": round(self.items / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+class Pipeline:
+    """Staged generator pipeline with bounded queues between stages.
+
+    `source` is any iterable; each stage is a generator transform
+    (iterable in -> iterable out) running in its own thread, so e.g. file
+    reading/chunking overlaps with embedding and upserting. Every queue holds
+    at most `queue_size` items, which keeps memory constant no matter how
+    large the source is. The first exception in any stage aborts the others
+    and is re-raised from run().
+    """
+
+    def __init__(self, source: Iterable[Any], stages: list[Stage], queue_size: int = 8):
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self.counters = [StageCounter("source")] + [StageCounter(name) for name, _ in stages]
+        self._stop = threading.Event()
+        self._errors: list[BaseException] = []
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _iter_queue(self, q: queue.Queue) -> Iterator[Any]:
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def _pump(self, items: Iterable[Any], counter: StageCounter, out_q: queue.Queue | None) -> None:
+        counter.started = time.perf_counter()
+        try:
+            for item in items:
+                counter.items += 1
+                if out_q is not None and not self._put(out_q, item):
+                    return
+                if self._stop.is_set():
+                    return
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            counter.finished = time.perf_counter()
+            if out_q is not None:
+                self._put(out_q, _DONE)
+
+    def stats(self) -> dict:
+        return {c.name: c.as_dict() for c in self.counters}
+
+    def run(self) -> dict:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [threading.Thread(
+            target=self._pump, args=(self.source, self.counters[0], queues[0] if queues else None),
+            name="ingest-source", daemon=True,
+        )]
+        for i, (name, fn) in enumerate(self.stages):
+            out_q = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(threading.Thread(
+                target=self._pump, args=(fn(self._iter_queue(queues[i])), self.counters[i + 1], out_q),
+                name=f"ingest-{name}", daemon=True,
+            ))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self._errors:
+            raise self._errors[0]
+        return self.stats()
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    batch: list[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_stage(embed: Callable[[list[str]], list[list[float]]]):
+    """(id, doc, meta) batches -> (batch, embeddings)."""
+    def stage(batches: Iterable[list[tuple[str, str, dict]]]):
+        for batch in batches:
+            yield batch, embed([doc for _, doc, _ in batch])
+    return stage
+
+
+def upsert_stage(store, on_written: Callable[[int], None] | None = None, store_documents: bool = True):
+    """(batch, embeddings) -> number of chunks written. With store_documents=False
+    the embedded text is not kept in the store (offset-based chunks)."""
+    def stage(items: Iterable[tuple[list[tuple[str, str, dict]], list[list[float]]]]):
+        for batch, emb in items:
+            docs = [d for _, d, _ in batch] if store_documents else None
+            store.upsert([i for i, _, _ in batch], docs, emb, [m for _, _, m in batch])
+            if on_written is not None:
+                on_written(len(batch))
+            yield len(batch)
+    return stage
+
+
+class Progress:
+    """Collects done/total/chunks counts and forwards them to a callback
+    (e.g. Job.update) as they change."""
+
+    def __init__(self, callback: Callable[..., None] | None, unit: str):
+        self.callback = callback
+        self.unit = unit
+        self.done = 0
+        self.total = None
+        self.chunks = 0
+        self._lock = threading.Lock()
+
+    def _emit(self) -> None:
+        if self.callback is not None:
+            self.callback(unit=self.unit, done=self.done, total=self.total, chunks=self.chunks)
+
+    def set_total(self, total: int) -> None:
+        self.total = total
+        self._emit()
+
+    def item_done(self) -> None:
+        with self._lock:
+            self.done += 1
+        self._emit()
+
+    def chunks_written(self, n: int) -> None:
+        with self._lock:
+            self.chunks += n
+        self._emit()
+
+
+def log_stats(label: str, stats: dict) -> None:
+    parts = [f"{name}={s['items']} ({s['per_sec']}/s)" for name, s in stats.items()]
+    print(f"[INGEST] {label}: " + ", ".join(parts))
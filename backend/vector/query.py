@@ -1,22 +1,37 @@
 from __future__ import annotations
 
-from .embedder import LocalEmbedder
+from .cache import LRUCache
+from .embedder import get_embedder
 from .chroma_store import ChromaStore
+from .source_store import SOURCE_STORE
+
+# Query embeddings keyed on (model, normalized expanded text). Module-level so
+# every retriever (/ask, /deep-research, ...) shares it; size/TTL are set by
+# SearchService from config.
+QUERY_EMBED_CACHE = LRUCache(maxsize=1024)
 
 class VectorRetriever:
-    def __init__(self, persist_dir: str, collection_name: str):
-        self.embedder = LocalEmbedder()
+    def __init__(self, persist_dir: str, collection_name: str, cache: LRUCache | None = None):
+        self.embedder = get_embedder()
         self.store = ChromaStore(persist_dir=persist_dir, collection_name=collection_name)
+        self.cache = cache if cache is not None else QUERY_EMBED_CACHE
 
-    def retrieve(self, query: str, k: int = 5, where: dict | None = None) -> list[dict]:
+    def embed_query(self, query: str) -> list[float]:
+        query = " ".join((query or "").lower().split())
         # light query expansion helps short triage queries (e.g., "issue with VPN")
         expanded = (
-            f"Endpoint issue description: {query}
-"
-            f"Consider: VPN/connectivity/authentication/DNS/certificates/routing/client.
-"
+            f"Endpoint issue description: {query}\n"
+            f"Consider: VPN/connectivity/authentication/DNS/certificates/routing/client.\n"
         )
-        q_emb = self.embedder.embed([expanded])[0]
+        key = (self.embedder.model_name, expanded)
+        q_emb = self.cache.get(key)
+        if q_emb is None:
+            q_emb = self.embedder.embed([expanded])[0]
+            self.cache.put(key, q_emb)
+        return q_emb
+
+    def retrieve(self, query: str, k: int = 5, where: dict | None = None) -> list[dict]:
+        q_emb = self.embed_query(query)
         res = self.store.query_by_embedding(q_emb, n_results=k, where=where)
 
         docs = res.get("documents", [[]])[0]
@@ -25,9 +40,16 @@ class VectorRetriever:
 
         out = []
         for i in range(len(docs)):
+            meta = (metas[i] if i < len(metas) else None) or {}
+            text = docs[i]
+            if text is None:
+                # offset-based file chunk: read the span back from the file
+                text = SOURCE_STORE.resolve(meta)
+                if text is None:
+                    continue  # source edited/removed since indexing; re-pointed or deleted on next re-index
             out.append({
-                "text": docs[i],
-                "metadata": metas[i] if i < len(metas) else {},
+                "text": text,
+                "metadata": meta,
                 "distance": dists[i] if i < len(dists) else None,
             })
         return out
@@ -28,17 +28,23 @@ Return ONLY a JSON object with keys:
 Be concise and action-oriented.
 """
 
-def run_claude_cli(prompt: str, claude_bin: str = "claude") -> str:
+def run_claude_cli(prompt: str, claude_bin: str = "claude", timeout: float | None = None) -> str:
+    # subprocess.run kills the child when the timeout expires
     proc = subprocess.run(
         [claude_bin],
         input=prompt.encode("utf-8"),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         check=False,
+        timeout=timeout,
     )
     out = proc.stdout.decode("utf-8", errors="ignore").strip()
     err = proc.stderr.decode("utf-8", errors="ignore").strip()
     return out if out else (err if err else "")
 
-def synthesize(user_query: str, contexts: list[dict], claude_bin: str = "claude") -> str:
-    return run_claude_cli(build_prompt(user_query, contexts), claude_bin=claude_bin)
+def synthesize(user_query: str, contexts: list[dict], claude_bin: str = "claude", executor=None) -> str | None:
+    """Run the CLI directly, or through a SynthesisExecutor (None on timeout/overload)."""
+    prompt = build_prompt(user_query, contexts)
+    if executor is not None:
+        return executor.run(prompt)
+    return run_claude_cli(prompt, claude_bin=claude_bin)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import codecs
+import os
+from typing import Iterable, Iterator
+
+BUFFER_SIZE = 1 << 20
+MAX_LINE_BYTES = 1 << 16
+
+
+def _utf8_boundary(raw: bytes) -> int:
+    """Length of the longest prefix of `raw` that does not end in an incomplete UTF-8 sequence."""
+    i = len(raw) - 1
+    while i > 0 and (raw[i] & 0xC0) == 0x80:
+        i -= 1
+    lead = raw[i]
+    need = 1 if lead < 0xC0 else 2 if lead < 0xE0 else 3 if lead < 0xF0 else 4
+    return len(raw) if len(raw) - i >= need else i
+
+
+def iter_lines(path: str, max_bytes: int = MAX_LINE_BYTES) -> Iterator[tuple[int, int, str]]:
+    """(start, end byte offset, decoded line) for every line, via buffered
+    reads. A line longer than `max_bytes` comes out in several pieces, so one
+    giant line cannot pull the whole file into memory."""
+    pos = 0
+    with open(path, "rb", buffering=BUFFER_SIZE) as f:
+        while True:
+            raw = f.readline(max_bytes)
+            if not raw:
+                return
+            if not raw.endswith(b"\n"):
+                # split inside an over-long line: never cut a UTF-8 sequence
+                keep = _utf8_boundary(raw)
+                if 0 < keep < len(raw):
+                    f.seek(keep - len(raw), os.SEEK_CUR)
+                    raw = raw[:keep]
+            yield pos, pos + len(raw), raw.decode("utf-8", errors="ignore")
+            pos += len(raw)
+
+
+def read_span(path: str, start: int, end: int) -> str | None:
+    """Decoded bytes [start, end) of `path` with a single seek; None if unreadable."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+    except OSError:
+        return None
+    return data.decode("utf-8", errors="ignore")
+
+
+def iter_windows(path: str, size: int = BUFFER_SIZE, overlap: int = 0) -> Iterator[str]:
+    """Decoded text in windows of about `size` bytes from fixed-size reads.
+    Each window starts with the last `overlap` characters of the previous one,
+    so any substring of up to overlap + 1 characters lies wholly inside some
+    window. Decoding is incremental: a UTF-8 sequence cut by a read boundary
+    is completed by the next read."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    tail = ""
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            raw = f.read(size)
+            text = decoder.decode(raw, final=not raw)
+            if not raw:
+                if text:
+                    yield tail + text
+                return
+            if not text:
+                continue
+            window = tail + text
+            yield window
+            tail = window[-overlap:] if overlap else ""
+
+
+def find_any(path: str, needles: Iterable[str], lower: bool = True) -> set[str]:
+    """Which of `needles` occur in the file (case-insensitively by default),
+    streaming it once with just enough overlap between windows."""
+    pending = {n for n in needles if n}
+    found: set[str] = set()
+    if not pending:
+        return found
+    overlap = max(len(n) for n in pending) - 1
+    for window in iter_windows(path, overlap=overlap):
+        if lower:
+            window = window.lower()
+        hits = {n for n in pending if n in window}
+        found |= hits
+        pending -= hits
+        if not pending:
+            break
+    return found
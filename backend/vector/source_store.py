@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import hashlib
+
+from .cache import LRUCache
+from .reader import read_span
+
+
+def span_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+
+def file_chunk_document(filename: str, path: str, text: str) -> str:
+    """What gets embedded for a file chunk (and what retrieval returns as its text)."""
+    return f"File: {filename}\nPath: {path}\n\n{text}"
+
+
+class SourceStore:
+    """Resolves offset-based file chunks back to text.
+
+    File chunks are stored in Chroma as embedding + metadata only
+    (path/start/end/hash); the text lives once, in the source file. A chunk
+    whose bytes no longer hash to what was indexed (file edited but not yet
+    re-indexed) resolves to None. Recently resolved spans are cached.
+    """
+
+    def __init__(self, cache_size: int = 1024):
+        self._cache = LRUCache(maxsize=cache_size)
+
+    def resolve(self, meta: dict) -> str | None:
+        path, start, end = meta.get("path"), meta.get("start"), meta.get("end")
+        if path is None or start is None or end is None:
+            return None
+        key = (path, int(start), int(end), meta.get("hash"))
+        text = self._cache.get(key)
+        if text is None:
+            text = read_span(path, int(start), int(end))
+            if text is None or (meta.get("hash") and span_hash(text) != meta["hash"]):
+                return None
+            self._cache.put(key, text)
+        return file_chunk_document(meta.get("filename") or "", path, text)
+
+
+SOURCE_STORE = SourceStore()
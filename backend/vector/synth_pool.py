@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import atexit
+import codecs
+import os
+import queue
+import select
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class SynthesisExecutor:
+    """Bounded, deadline-aware runner for the Claude CLI.
+
+    - at most `max_concurrency` CLI processes run at once; beyond
+      `max_queue` waiting calls, new calls are shed immediately
+    - every call has a deadline (queue wait included); a CLI that overruns
+      it is killed and run() returns None so the caller can fall back
+    - the CLI is one-shot (prompt on stdin, answer on stdout, exit), so a
+      process cannot serve two prompts; with `prespawn` each worker slot
+      keeps an idle, already-started process waiting on stdin, which takes
+      process start-up off the request path; used processes are replaced by
+      a background refill thread, never by the call that used them
+    """
+
+    def __init__(self, claude_bin: str = "claude", max_concurrency: int = 4, timeout: float = 30.0,
+                 max_queue: int = 32, prespawn: bool = False):
+        self.claude_bin = claude_bin
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.prespawn = prespawn
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="synth")
+        # shared by pooled calls and streams so both count against max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._warm: queue.Queue[subprocess.Popen] = queue.Queue()
+        self._lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=500)
+        self.queued = 0
+        self.in_flight = 0
+        self.counts = {"submitted": 0, "completed": 0, "timeouts": 0, "errors": 0, "shed": 0, "warm_hits": 0}
+        self._closed = False
+        # one token per warm process to start; None stops the refill thread
+        self._refills: queue.SimpleQueue[object | None] = queue.SimpleQueue()
+        if prespawn:
+            threading.Thread(target=self._refill_loop, name="synth-refill", daemon=True).start()
+            for _ in range(max_concurrency):
+                self._refill()
+        atexit.register(self.shutdown)
+
+    def _spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            [self.claude_bin], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+
+    def _refill(self) -> None:
+        """Ask the refill thread for one more warm process (returns at once)."""
+        self._refills.put(True)
+
+    def _refill_loop(self) -> None:
+        while self._refills.get() is not None:
+            try:
+                proc = self._spawn()
+            except OSError:
+                continue  # binary missing; calls will report the error themselves
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    self._warm.put(proc)
+            if closed:
+                proc.kill()
+                proc.wait()
+                return
+
+    def _take_process(self) -> subprocess.Popen:
+        while True:
+            try:
+                proc = self._warm.get_nowait()
+            except queue.Empty:
+                return self._spawn()
+            if proc.poll() is None:
+                self._bump("warm_hits")
+                return proc
+            # idle process died (e.g. CLI gave up waiting on stdin); discard it
+
+    def _bump(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def _call(self, prompt: str, deadline: float) -> str | None:
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            with self._lock:
+                self.in_flight -= 1
+            self._bump("timeouts")
+            return None
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._bump("timeouts")
+                return None
+            proc = self._take_process()
+            if self.prespawn:
+                self._refill()  # replacement starts while this one runs
+            try:
+                out, err = proc.communicate(prompt.encode("utf-8"), timeout=remaining)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                self._bump("timeouts")
+                return None
+            self._bump("completed")
+            out_s = out.decode("utf-8", errors="ignore").strip()
+            err_s = err.decode("utf-8", errors="ignore").strip()
+            return out_s if out_s else (err_s if err_s else "")
+        except OSError:
+            self._bump("errors")
+            return None
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.in_flight -= 1
+
+    def stream(self, prompt: str, timeout: float | None = None, read_size: int = 1024):
+        """Yield decoded stdout pieces as the CLI writes them.
+
+        Admission is the same as run(): beyond `max_queue` waiting calls the
+        stream is shed, and the deadline covers the wait for a slot. Stops (and
+        kills the CLI) at the deadline. Closing the generator early (e.g. the
+        HTTP client disconnected) also kills the CLI.
+        """
+        start = time.monotonic()
+        deadline = start + (timeout if timeout is not None else self.timeout)
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.counts["shed"] += 1
+                return
+            self.queued += 1
+            self.counts["submitted"] += 1
+        acquired = self._slots.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            self.queued -= 1
+        if not acquired:
+            self._bump("timeouts")
+            return
+        with self._lock:
+            self.in_flight += 1
+        proc = None
+        try:
+            proc = self._take_process()
+            if self.prespawn:
+                self._refill()
+            proc.stdin.write(prompt.encode("utf-8"))
+            proc.stdin.close()
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+            fd, err_fd = proc.stdout.fileno(), proc.stderr.fileno()
+            watch = [fd, err_fd]
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._bump("timeouts")
+                    break
+                ready, _, _ = select.select(watch, [], [], remaining)
+                if err_fd in ready:
+                    # drain stderr so a chatty CLI cannot block on a full pipe
+                    if not os.read(err_fd, read_size):
+                        watch.remove(err_fd)
+                if fd not in ready:
+                    continue
+                data = os.read(fd, read_size)
+                if not data:
+                    tail = decoder.decode(b"", final=True)
+                    if tail:
+                        yield tail
+                    self._bump("completed")
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+        except OSError:
+            self._bump("errors")
+        finally:
+            if proc is not None and proc.poll() is None:
+                proc.kill()
+            if proc is not None:
+                proc.wait()
+                for pipe in (proc.stdout, proc.stderr):
+                    if pipe:
+                        pipe.close()
+            self._slots.release()
+            with self._lock:
+                self.in_flight -= 1
+            self._latencies.append(time.monotonic() - start)
+
+    def run(self, prompt: str, timeout: float | None = None) -> str | None:
+        """Synthesize within the deadline; None on timeout, overload or error."""
+        start = time.monotonic()
+        deadline = start + (timeout if timeout is not None else self.timeout)
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.counts["shed"] += 1
+                return None
+            self.queued += 1
+            self.counts["submitted"] += 1
+        fut = self._pool.submit(self._call, prompt, deadline)
+        try:
+            # small grace so the worker's own kill/cleanup normally wins
+            result = fut.result(timeout=max(0.0, deadline - time.monotonic()) + 1.0)
+        except Exception:
+            result = None
+        self._latencies.append(time.monotonic() - start)
+        return result
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+
+        def pct(p: float):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))], 3) if lat else None
+
+        with self._lock:
+            return dict(
+                self.counts,
+                queue_depth=self.queued,
+                in_flight=self.in_flight,
+                warm_idle=self._warm.qsize(),
+                max_concurrency=self.max_concurrency,
+                timeout=self.timeout,
+                latency_p50=pct(0.5),
+                latency_p95=pct(0.95),
+            )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+        self._refills.put(None)
+        while True:
+            try:
+                proc = self._warm.get_nowait()
+            except queue.Empty:
+                break
+            proc.kill()
+            proc.wait()
+        self._pool.shutdown(wait=False)